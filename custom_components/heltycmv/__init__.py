@@ -5,37 +5,120 @@ from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform, CONF_HOST, CONF_PORT
 from homeassistant.core import HomeAssistant
 from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.typing import ConfigType
 
-from .const import DOMAIN
 from .cmv import HeltyCMV
-from .coordinator import HeltyDataUpdateCoordinator
+from .const import CONF_CMV_ID, CONF_UNIT_NAME, DATA_HUB, DOMAIN
+from .coordinator import STORAGE_VERSION, HeltyDataUpdateCoordinator
+from .hub import HeltyHub
+from .services import async_setup_services
 
 PLATFORMS: list[Platform] = [Platform.SENSOR, Platform.FAN, Platform.SWITCH, Platform.BUTTON]
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Set up the domain services shared by all units."""
+    async_setup_services(hass)
+    return True
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up Helty CMV from a config entry."""
 
     hass.data.setdefault(DOMAIN, {})
+    # Un solo hub per tutte le unità: connessioni, limite di concorrenza e slot di polling
+    hub: HeltyHub = hass.data.setdefault(DATA_HUB, HeltyHub())
 
-    cmv_device = HeltyCMV(entry.data[CONF_HOST], entry.data[CONF_PORT])
+    cmv_device = hub.create_device(
+        entry.entry_id, entry.data[CONF_HOST], entry.data[CONF_PORT], entry.data.get(CONF_CMV_ID)
+    )
+    await _async_migrate_identity(hass, entry, cmv_device)
 
-    coordinator = HeltyDataUpdateCoordinator(hass, device=cmv_device)
+    coordinator = HeltyDataUpdateCoordinator(
+        hass,
+        device=cmv_device,
+        options=entry.options,
+        store_key=f"{DOMAIN}.{entry.entry_id}",
+        unit_name=entry.data.get(CONF_UNIT_NAME),
+    )
+    hub.register(entry.entry_id, coordinator)
 
-    try:
-        await coordinator.async_config_entry_first_refresh()
-    except ConfigEntryNotReady:
-        raise
+    if await coordinator.async_restore():
+        # Entities start from the stored snapshot; the unit is polled in the
+        # background so an unreachable unit does not delay startup
+        entry.async_create_background_task(
+            hass, coordinator.async_background_start(), f"{DOMAIN} first refresh {entry.entry_id}"
+        )
+    else:
+        # Commands the unit does not answer would fail every poll, the first one included
+        await coordinator.async_probe_capabilities()
+        try:
+            await coordinator.async_config_entry_first_refresh()
+        except ConfigEntryNotReady:
+            await _async_remove_from_hub(hass, entry)
+            raise
 
     hass.data[DOMAIN][entry.entry_id] = coordinator
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    coordinator.async_start_push()
+    await coordinator.async_start_proxy()
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
 
     return True
 
 
+async def _async_migrate_identity(
+    hass: HomeAssistant, entry: ConfigEntry, device: HeltyCMV
+) -> None:
+    """Store the identity of entries created before it was recorded.
+
+    The entities keep the id derived from the original host. The unit is
+    searched by its VMNM name after an IP change, so the name is read from
+    the unit; the entry title, which users can rename, is only used when the
+    unit does not answer.
+    """
+    if CONF_CMV_ID in entry.data:
+        return
+    unit_name = entry.data.get(CONF_UNIT_NAME)
+    if unit_name is None:
+        unit_name = await device.get_cmv_name() or entry.title
+    hass.config_entries.async_update_entry(
+        entry,
+        data={
+            **entry.data,
+            CONF_CMV_ID: device.cmv_id,
+            CONF_UNIT_NAME: unit_name,
+        },
+    )
+
+
+async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the config entry when its options change."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Drop the stored snapshot of a removed unit."""
+    await Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}").async_remove()
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     if unload_ok := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
-        hass.data[DOMAIN].pop(entry.entry_id)
+        coordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        await coordinator.async_shutdown()
+        await _async_remove_from_hub(hass, entry)
+
+    return unload_ok
+
 
-    return unload_ok
\ No newline at end of file
+async def _async_remove_from_hub(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the unit from the shared hub, dropping the hub with the last unit."""
+    hub: HeltyHub = hass.data[DATA_HUB]
+    await hub.async_remove(entry.entry_id)
+    if hub.empty:
+        hass.data.pop(DATA_HUB)
\ No newline at end of file
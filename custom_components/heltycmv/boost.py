@@ -0,0 +1,141 @@
+"""Boost automatico in base all'umidità interna."""
+from __future__ import annotations
+
+from datetime import time as dt_time
+import logging
+
+from .const import (
+    DEFAULT_BOOST_HUMIDITY,
+    DEFAULT_BOOST_HYSTERESIS,
+    DEFAULT_BOOST_MAX_DURATION,
+    DEFAULT_BOOST_MIN_DURATION,
+    FAN_LOW,
+    PRESET_BOOST,
+    PRESET_NIGHT,
+)
+from .parser import HeltyCMVSnapshot, current_mode
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def in_window(now: dt_time, start: dt_time | None, end: dt_time | None) -> bool:
+    """True se now cade nella fascia [start, end), anche a cavallo della mezzanotte."""
+    if start is None or end is None or start == end:
+        return False
+    if start < end:
+        return start <= now < end
+    return now >= start or now < end
+
+
+class HeltyBoostController:
+    """Decide quando attivare e terminare il boost, e la fascia notturna.
+
+    Il boost parte quando l'umidità raggiunge on_humidity e termina quando
+    scende sotto on_humidity - hysteresis, ma non prima di min_duration
+    secondi e comunque dopo max_duration: in quel caso non riparte finché
+    l'umidità non è scesa sotto la soglia di spegnimento. Alla fine del
+    boost si torna alla modalità precedente, o al preset notturno se si è
+    nella fascia notturna.
+    Se la modalità viene cambiata a mano durante il boost il controllo
+    viene lasciato all'utente, e il boost non riparte finché l'umidità non
+    è scesa sotto la soglia di spegnimento. All'inizio della fascia notturna si passa al
+    preset notturno e alla fine si torna alla modalità del giorno.
+    evaluate restituisce solo la modalità da scrivere, o None.
+    """
+
+    def __init__(
+        self,
+        on_humidity: float = DEFAULT_BOOST_HUMIDITY,
+        hysteresis: float = DEFAULT_BOOST_HYSTERESIS,
+        min_duration: float = DEFAULT_BOOST_MIN_DURATION,
+        max_duration: float = DEFAULT_BOOST_MAX_DURATION,
+        night_start: dt_time | None = None,
+        night_end: dt_time | None = None,
+    ) -> None:
+        self.on_humidity = on_humidity
+        self.off_humidity = on_humidity - hysteresis
+        self.min_duration = min_duration
+        self.max_duration = max(max_duration, min_duration)
+        self.night_start = night_start
+        self.night_end = night_end
+        self.boosting_since: float | None = None
+        self._restore_mode = None
+        # Boost terminato per durata massima: non riparte sopra la soglia
+        self._latched = False
+        self._night_active = False
+        self._day_mode = None
+
+    @property
+    def active(self) -> bool:
+        """True se il boost in corso è stato avviato dal controller."""
+        return self.boosting_since is not None
+
+    def evaluate(self, snapshot: HeltyCMVSnapshot, now: float, local_time: dt_time):
+        """Modalità da impostare dopo questa lettura, None se non serve nulla.
+
+        now è un orologio monotono in secondi, local_time l'ora locale.
+        """
+        night = in_window(local_time, self.night_start, self.night_end)
+        mode = current_mode(snapshot)
+        humidity = snapshot.indoor_humidity
+
+        if self.boosting_since is not None:
+            if snapshot.preset != PRESET_BOOST:
+                _LOGGER.debug("Boost interrotto a mano, il controller si fa da parte")
+                self.boosting_since = None
+                # Come dopo la durata massima: non riparte finché l'umidità non scende
+                self._latched = True
+                return None
+            elapsed = now - self.boosting_since
+            if elapsed >= self.max_duration:
+                self._latched = True
+                return self._end_boost(night)
+            if elapsed >= self.min_duration and humidity is not None and humidity <= self.off_humidity:
+                return self._end_boost(night)
+            return None
+
+        if self._latched and (humidity is None or humidity <= self.off_humidity):
+            self._latched = False
+
+        if (
+            humidity is not None
+            and humidity >= self.on_humidity
+            and not self._latched
+            and snapshot.preset != PRESET_BOOST
+        ):
+            self.boosting_since = now
+            self._restore_mode = mode
+            self._night_active = night
+            return PRESET_BOOST
+
+        if night != self._night_active:
+            self._night_active = night
+            if night:
+                self._day_mode = mode
+                return PRESET_NIGHT if mode != PRESET_NIGHT else None
+            # Fine della fascia: si torna alla modalità del giorno solo se
+            # nel frattempo nessuno l'ha cambiata
+            if mode == PRESET_NIGHT and self._day_mode not in (None, PRESET_NIGHT):
+                return self._day_mode
+        return None
+
+    def _end_boost(self, night: bool):
+        self.boosting_since = None
+        self._night_active = night
+        if night:
+            return PRESET_NIGHT
+        if self._restore_mode == PRESET_NIGHT:
+            # Boost partito di notte e finito di giorno
+            return self._day_mode if self._day_mode not in (None, PRESET_NIGHT) else FAN_LOW
+        if self._restore_mode in (None, PRESET_BOOST):
+            return FAN_LOW
+        return self._restore_mode
+
+    def as_dict(self) -> dict:
+        return {
+            "active": self.active,
+            "latched": self._latched,
+            "night": self._night_active,
+            "on_humidity": self.on_humidity,
+            "off_humidity": self.off_humidity,
+        }
@@ -13,13 +13,13 @@ _LOGGER = logging.getLogger(__name__)
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
     coordinator: HeltyDataUpdateCoordinator = hass.data[DOMAIN][config_entry.entry_id]
-    async_add_entities([HeltyCMVResetFilter(coordinator)], True)
+    async_add_entities([HeltyCMVResetFilter(coordinator)])
 
 
 class HeltyCMVResetFilter(CoordinatorEntity, ButtonEntity):
 
     def __init__(self, coordinator: HeltyDataUpdateCoordinator):
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=())
         self._cmv = coordinator.device
         self._attr_unique_id = f"{self._cmv.cmv_id}_filter_reset"
         self._attr_name = f"{self._cmv.name} CMV Filter Usage Reset"
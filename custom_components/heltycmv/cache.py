@@ -0,0 +1,62 @@
+"""Ultimi valori validi di un'unità Helty, con l'età di ciascun campo."""
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+from .const import DEFAULT_MAX_STALENESS
+
+
+class HeltySnapshotCache:
+    """Ricorda quando ogni campo dell'istantanea è stato letto l'ultima volta.
+
+    Finché il dispositivo risponde tutti i campi sono validi. Quando un
+    polling fallisce la cache diventa stale: i valori restano serviti finché
+    la loro età non supera max_staleness. Tempi in secondi, orologio monotono.
+    """
+
+    def __init__(self, max_staleness: float = DEFAULT_MAX_STALENESS) -> None:
+        self.max_staleness = max_staleness
+        self.stale_since: float | None = None
+        self._updated: dict[str, float] = {}
+
+    @property
+    def stale(self) -> bool:
+        """True se l'ultimo polling non è riuscito."""
+        return self.stale_since is not None
+
+    def record(self, fields: Iterable[str], now: float) -> None:
+        """Segna come appena letti i campi indicati."""
+        for field in fields:
+            self._updated[field] = now
+
+    def record_success(self) -> None:
+        self.stale_since = None
+
+    def record_failure(self, now: float) -> None:
+        if self.stale_since is None:
+            self.stale_since = now
+
+    def age(self, field: str, now: float) -> float | None:
+        """Secondi dall'ultima lettura del campo, None se mai letto."""
+        updated = self._updated.get(field)
+        return now - updated if updated is not None else None
+
+    def fresh(self, field: str, now: float) -> bool:
+        """True se il valore in cache può ancora essere mostrato."""
+        if not self.stale:
+            return True
+        age = self.age(field, now)
+        return age is not None and age <= self.max_staleness
+
+    def servable(self, now: float) -> bool:
+        """True se almeno un campo è ancora abbastanza recente."""
+        return any(now - updated <= self.max_staleness for updated in self._updated.values())
+
+    def next_expiry(self, now: float) -> float | None:
+        """Secondi alla scadenza del prossimo campo ancora valido."""
+        remaining = [
+            updated + self.max_staleness - now
+            for updated in self._updated.values()
+            if updated + self.max_staleness > now
+        ]
+        return min(remaining) if remaining else None
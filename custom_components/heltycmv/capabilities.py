@@ -0,0 +1,101 @@
+"""Comandi e campi che un'unità Helty supporta davvero."""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any
+
+from .parser import SENSOR_FIELDS, parse_config, parse_sensors
+from .protocol import CONFIG_HEADER, SENSORS_HEADER
+
+ALL_SENSOR_FIELDS = frozenset(sensor.key for sensor in SENSOR_FIELDS)
+
+
+@dataclass(frozen=True, slots=True)
+class HeltyCapabilities:
+    """Risultato della verifica delle funzioni di un'unità.
+
+    Il firmware non riporta la propria versione: l'impronta è data dal
+    numero di campi delle risposte VMGI e VMGO, che cambia con modello e
+    firmware. Finché la verifica non è stata fatta (probed False) si assume
+    che tutto sia supportato, come prima.
+    """
+
+    sensors: bool = True
+    config: bool = True
+    leds: bool = True
+    sensor_fields: frozenset[str] = field(default=ALL_SENSOR_FIELDS)
+    sensors_length: int = 0
+    config_length: int = 0
+    probed: bool = False
+
+    @property
+    def fingerprint(self) -> str:
+        return f"vmgi{self.sensors_length}-vmgo{self.config_length}"
+
+    @property
+    def complete(self) -> bool:
+        """True se l'unità risponde a tutti i comandi con tutti i campi noti."""
+        return (
+            self.sensors
+            and self.config
+            and self.leds
+            and self.sensor_fields == ALL_SENSOR_FIELDS
+        )
+
+    @property
+    def entities(self) -> tuple:
+        """Ciò che decide quali entità vengono create."""
+        return (self.sensor_fields, self.config, self.leds)
+
+    def matches(self, sensors_raw: tuple, config_raw: tuple) -> bool:
+        """False se le risposte lette hanno un formato diverso da quello verificato."""
+        if not self.probed:
+            return True
+        return (not sensors_raw or len(sensors_raw) == self.sensors_length) and (
+            not config_raw or len(config_raw) == self.config_length
+        )
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "sensors": self.sensors,
+            "config": self.config,
+            "leds": self.leds,
+            "sensor_fields": sorted(self.sensor_fields),
+            "sensors_length": self.sensors_length,
+            "config_length": self.config_length,
+            "fingerprint": self.fingerprint,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> HeltyCapabilities:
+        return cls(
+            sensors=data["sensors"],
+            config=data["config"],
+            leds=data["leds"],
+            sensor_fields=frozenset(data["sensor_fields"]) & ALL_SENSOR_FIELDS,
+            sensors_length=data["sensors_length"],
+            config_length=data["config_length"],
+            probed=True,
+        )
+
+
+ALL_CAPABILITIES = HeltyCapabilities()
+
+
+def capabilities_from_replies(sensors_reply: bytes, config_reply: bytes) -> HeltyCapabilities:
+    """Funzioni deducibili dalle risposte a VMGI? e VMGH?."""
+    sensors = sensors_reply.startswith(SENSORS_HEADER + b',')
+    config = config_reply.startswith(CONFIG_HEADER + b',')
+    sensor_values = parse_sensors(sensors_reply) if sensors else {}
+    config_values = parse_config(config_reply) if config else {}
+    return HeltyCapabilities(
+        sensors=sensors,
+        config=config,
+        leds=config_values.get("leds_on") is not None,
+        sensor_fields=frozenset(
+            key for key in ALL_SENSOR_FIELDS if sensor_values.get(key) is not None
+        ),
+        sensors_length=len(sensor_values.get("sensors_raw", ())),
+        config_length=len(config_values.get("config_raw", ())),
+        probed=True,
+    )
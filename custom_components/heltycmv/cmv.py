@@ -1,38 +1,121 @@
 import asyncio
 import logging
+import time
+from .capabilities import ALL_CAPABILITIES, HeltyCapabilities, capabilities_from_replies
+from .command_queue import HeltyCommandQueue
+from .connection import HeltyConnection
 from .const import (
     NAME_CMD,
     SENSORS_CMD,
     CONFIG_GET_CMD,
     CMV_NAME_PREFIX,
-    PRESET_BOOST,
-    PRESET_NIGHT,
-    PRESET_COOLING,
-    FAN_LOW,
-    FAN_MEDIUM,
-    FAN_HIGH,
-    FAN_HIGHEST,
     MODE_CMDS,
     LED_OFF_CMD,
     LED_ON_CMD,
     RESET_FILTER,
 )
+from .parser import PARSERS, HeltyCMVSnapshot, HeltyResponseParser, valid_values
+from .protocol import EXPECTED_HEADERS, OK_REPLY, WRITE_PREFIX
+from .resilience import (
+    ATTEMPT_TIMEOUT,
+    RETRY_ATTEMPTS,
+    RETRY_MAX_DELAY,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    CircuitOpenError,
+    HeltyCircuitBreaker,
+    retry_delay,
+    retry_safe,
+)
+from .stats import HeltyDeviceStats
 
 _LOGGER = logging.getLogger(__name__)
 
 
 class HeltyCMV:
-    def __init__(self, host: str, port: int) -> None:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        limiter: asyncio.Semaphore | None = None,
+        cmv_id: str | None = None,
+    ) -> None:
         self._host = host
         self._port = port
         self.name = host
-        self._id = host.lower()
+        # L'id resta quello del primo indirizzo anche se l'unità cambia IP
+        self._id = (cmv_id or host).lower()
         self.online = True
+        self.stats = HeltyDeviceStats()
+        self._connection = HeltyConnection(host, port, self.stats)
+        self._queue = HeltyCommandQueue(self._send_cmv_cmds_async)
+        self._parser = HeltyResponseParser(self.stats)
+        # Limite condiviso di dispositivi interrogati contemporaneamente
+        self._limiter = limiter
+        self._breaker = HeltyCircuitBreaker(host)
+        self.busy = False
+        # Comandi e campi supportati, tutti finché la verifica non è stata fatta
+        self.capabilities: HeltyCapabilities = ALL_CAPABILITIES
+        # Ultima risposta grezza di ogni lettura e quando è arrivata, per il proxy
+        self._replies: dict[bytes, tuple[bytes, float]] = {}
 
     @property
     def cmv_id(self) -> str:
         return self._id
 
+    @property
+    def host(self) -> str:
+        return self._host
+
+    @property
+    def port(self) -> int:
+        return self._port
+
+    @property
+    def connected(self) -> bool:
+        return self._connection.connected
+
+    def set_push_listener(self, listener) -> None:
+        """Registra chi riceve i campi delle risposte VMGI/VMGO non richieste.
+
+        Il listener riceve un dizionario con i soli campi letti correttamente;
+        con None le risposte non richieste tornano a essere scartate.
+        """
+        if listener is None:
+            self._connection.unsolicited_callback = None
+            return
+
+        def handle_frame(frame: bytes) -> None:
+            _LOGGER.debug("Helty %s: risposta non richiesta %s", self.name, frame)
+            # Fuori dalla cache del parser, che vale per le letture richieste:
+            # altrimenti il polling successivo la prenderebbe per invariata
+            parse = PARSERS.get(frame[:4])
+            if parse is not None and (values := valid_values(parse(frame))):
+                listener(values)
+
+        self._connection.unsolicited_callback = handle_frame
+
+    @property
+    def read_fields(self) -> frozenset[str]:
+        """Campi letti correttamente dall'ultima async_get_snapshot."""
+        return self._parser.last_fields
+
+    @property
+    def pending_commands(self) -> int:
+        return self._queue.pending
+
+    def diagnostics(self) -> dict:
+        """Stato della connessione e statistiche dei comandi."""
+        return {
+            "online": self.online,
+            "connected": self._connection.connected,
+            "persistent": self._connection.persistent,
+            "pipelining": self._connection.pipelining,
+            "pending_commands": self._queue.pending,
+            "circuit": self._breaker.as_dict(),
+            "stats": self.stats.as_dict(),
+        }
+
     async def test_connection(self) -> bool:
         """Test connectivity to the Dummy hub is OK."""
         cmv_name = await self.get_cmv_name()
@@ -40,143 +123,247 @@ class HeltyCMV:
             return False
         return True
 
+    async def async_close(self) -> None:
+        """Chiude la connessione persistente verso il dispositivo."""
+        await self._queue.close()
+        await self._connection.close()
+
     async def _execute_cmv_cmd_async(self, cmd):
+        """Accoda il comando: il dispositivo riceve un comando alla volta."""
+        return await self._queue.submit(cmd)
+
+    async def async_proxy_command(self, cmd: bytes, ttl: float) -> tuple[bytes, bool]:
+        """Risposta a un comando ricevuto dal proxy e se è stata presa dalla cache.
+
+        Le letture più recenti di ttl secondi non vengono ripetute; tutto il
+        resto passa dalla coda, come i comandi dell'integrazione.
+        Solleva ConnectionError se il dispositivo non risponde.
         """
-        Versione asincrona che non blocca Home Assistant.
-        Gestisce anche gli errori di connessione.
+        cached = self._replies.get(cmd)
+        if cached is not None and time.monotonic() - cached[1] <= ttl:
+            return cached[0], True
+        return await self._execute_cmv_cmd_async(cmd), False
+
+    async def execute_batch(self, cmds: list[bytes]) -> list[bytes]:
+        """Esegue più comandi in un solo giro, con le risposte nello stesso ordine.
+
+        Se il firmware lo consente i comandi sono scritti uno dopo l'altro
+        sulla stessa connessione senza attendere le singole risposte.
+        Solleva ConnectionError se il dispositivo non risponde.
         """
-        try:
-            # Imposta un timeout per l'intera operazione
-            async with asyncio.timeout(10):
-                reader, writer = await asyncio.open_connection(self._host, self._port)
+        return await self._queue.submit_many(cmds)
 
-                writer.write(cmd)
-                await writer.drain()
+    async def _send_cmv_cmds_async(self, cmds):
+        """Invia i comandi ripetendo i tentativi falliti quando è sicuro farlo.
 
-                data = await reader.read(1024)
+        Ogni tentativo ha un timeout breve. Le letture e le scritture di un
+        valore assoluto vengono ripetute con un'attesa casuale crescente; un
+        gruppo con il reset dei filtri solo se nulla è stato inviato. Il
+        circuit breaker fa fallire subito le richieste a un'unità che non
+        risponde, finché la richiesta di prova non va a buon fine.
+        """
+        attempt = 0
+        while True:
+            if not self._breaker.allow():
+                self.stats.circuit_rejections += 1
+                self._set_offline(f"nessuna risposta, nuovo tentativo tra {self._breaker.retry_in:.0f}s")
+                raise CircuitOpenError(f"Helty {self.name} non raggiungibile")
+            try:
+                data = await self._send_cmv_cmds_limited_async(cmds)
+            except (asyncio.TimeoutError, ConnectionRefusedError, OSError) as e:
+                half_open = self._breaker.state == STATE_HALF_OPEN
+                self._breaker.record_failure()
+                attempt += 1
+                if (
+                    half_open
+                    or attempt >= RETRY_ATTEMPTS
+                    or self._breaker.state == STATE_OPEN
+                    or self._connection.reconnect_delay > RETRY_MAX_DELAY
+                    or (self._connection.request_sent and not retry_safe(cmds))
+                ):
+                    self._set_offline(e)
+                    # Solleva un'eccezione che può essere gestita dai metodi chiamanti
+                    raise ConnectionError from e
+                self.stats.request_retries += 1
+                _LOGGER.debug("Helty %s: tentativo %s fallito (%r), riprovo", self.name, attempt, e)
+                await asyncio.sleep(
+                    max(retry_delay(attempt - 1), self._connection.reconnect_delay)
+                )
+                continue
+            self._breaker.record_success()
+            self._remember_replies(cmds, data)
+            # La connessione è andata a buon fine, quindi il dispositivo è online
+            if not self.online:
+                _LOGGER.info("Dispositivo Helty %s è tornato online", self.name)
+                self.online = True
+            return data
+
+    async def _send_cmv_cmds_limited_async(self, cmds):
+        """Attende il proprio turno nel limite condiviso e invia i comandi."""
+        if self._limiter is None:
+            return await self._send_cmv_cmds_now_async(cmds)
+        async with self._limiter:
+            self.busy = True
+            try:
+                return await self._send_cmv_cmds_now_async(cmds)
+            finally:
+                self.busy = False
+
+    async def _send_cmv_cmds_now_async(self, cmds):
+        """
+        Versione asincrona che non blocca Home Assistant.
+        Un singolo tentativo, con un timeout breve.
+        """
+        try:
+            async with asyncio.timeout(ATTEMPT_TIMEOUT):
+                # Il socket resta aperto tra un comando e l'altro
+                return await self._connection.execute_batch(cmds)
+        except asyncio.TimeoutError:
+            self.stats.record_timeout(cmds)
+            raise
+        except (ConnectionRefusedError, OSError):
+            self.stats.record_error(cmds)
+            raise
 
-                writer.close()
-                await writer.wait_closed()
+    def _remember_replies(self, cmds, replies) -> None:
+        """Conserva le risposte delle letture; una scrittura le rende vecchie."""
+        if any(cmd.startswith(WRITE_PREFIX) for cmd in cmds):
+            self._replies.clear()
+        now = time.monotonic()
+        for cmd, reply in zip(cmds, replies):
+            header = EXPECTED_HEADERS.get(cmd)
+            if header is not None and reply.startswith(header):
+                self._replies[cmd] = (reply, now)
 
-                # La connessione è andata a buon fine, quindi il dispositivo è online
-                if not self.online:
-                    _LOGGER.info("Dispositivo Helty %s è tornato online", self.name)
-                    self.online = True
+    def _set_offline(self, reason) -> None:
+        # Se c'è un errore di rete, il dispositivo è offline
+        if self.online:
+            _LOGGER.warning(
+                "Impossibile connettersi a Helty %s: %s. Il dispositivo è offline.",
+                self.name,
+                str(reason) or "nessuna risposta",
+            )
+            self.online = False
 
-                return data.decode('ASCII').strip()
+    async def async_probe_capabilities(self) -> HeltyCapabilities | None:
+        """Invia VMGI? e VMGH? separatamente per capire quali sono supportati.
 
-        except (asyncio.TimeoutError, ConnectionRefusedError, OSError) as e:
-            # Se c'è un errore di rete, il dispositivo è offline
-            if self.online:
-                _LOGGER.warning("Impossibile connettersi a Helty %s: %s. Il dispositivo è offline.", self.name, e)
-                self.online = False
-            # Solleva un'eccezione che può essere gestita dai metodi chiamanti
-            raise ConnectionError from e
+        Un comando è considerato non supportato solo se l'unità risponde con
+        qualcos'altro. None se uno dei due resta senza risposta: un timeout
+        non distingue un comando sconosciuto da un'unità instabile, e la
+        verifica va ripetuta.
+        """
+        replies = []
+        for cmd in (SENSORS_CMD, CONFIG_GET_CMD):
+            try:
+                replies.append(await self._execute_cmv_cmd_async(cmd))
+            except ConnectionError:
+                return None
+        return capabilities_from_replies(*replies)
 
     async def get_cmv_name(self):
         try:
             data = await self._execute_cmv_cmd_async(NAME_CMD)
-            return data.removeprefix(CMV_NAME_PREFIX).strip()
+            return data.decode('ASCII', 'replace').removeprefix(CMV_NAME_PREFIX).strip()
         except ConnectionError:
             return None
 
+    async def async_get_snapshot(
+        self,
+        base: HeltyCMVSnapshot | None = None,
+        *,
+        sensors: bool = True,
+        config: bool = True,
+    ) -> HeltyCMVSnapshot:
+        """Legge lo stato inviando una sola volta ciascun comando.
+
+        Con sensors o config a False il relativo comando non viene inviato e
+        i campi corrispondenti sono copiati da base.
+        Solleva ConnectionError se il dispositivo non risponde.
+        """
+        cmds = []
+        if sensors and self.capabilities.sensors:
+            cmds.append(SENSORS_CMD)
+        if config and self.capabilities.config:
+            cmds.append(CONFIG_GET_CMD)
+        replies = await self.execute_batch(cmds)
+        return self._parser.snapshot(base, replies)
+
     async def get_cmv_indoor_air_temperature(self):
         try:
-            indoor_air_temp = None
             raw_data = await self._execute_cmv_cmd_async(SENSORS_CMD)
-            data = raw_data.strip().split(',')
-            if data[0] == "VMGI":
-                indoor_air_temp = float(int(data[1]) / 10)
-            return indoor_air_temp
-        except (ConnectionError, IndexError, ValueError):
+            return self._parser.parse(raw_data).get("indoor_temp")
+        except ConnectionError:
             return None
 
     async def get_cmv_outdoor_air_temperature(self):
         try:
-            outdoor_air_temp = None
             raw_data = await self._execute_cmv_cmd_async(SENSORS_CMD)
-            data = raw_data.strip().split(',')
-            if data[0] == "VMGI":
-                outdoor_air_temp = float(int(data[2]) / 10)
-            return outdoor_air_temp
-        except (ConnectionError, IndexError, ValueError):
+            return self._parser.parse(raw_data).get("outdoor_temp")
+        except ConnectionError:
             return None
 
     async def get_cmv_indoor_humidity(self):
         try:
-            indoor_air_humidity = None
             raw_data = await self._execute_cmv_cmd_async(SENSORS_CMD)
-            data = raw_data.strip().split(',')
-            if data[0] == "VMGI":
-                indoor_air_humidity = float(int(data[3]) / 10)
-            return indoor_air_humidity
-        except (ConnectionError, IndexError, ValueError):
+            return self._parser.parse(raw_data).get("indoor_humidity")
+        except ConnectionError:
             return None
 
     async def get_cmv_op_status(self):
         try:
             raw_data = await self._execute_cmv_cmd_async(CONFIG_GET_CMD)
-            data = raw_data.strip().split(',')
-            if data[0] == "VMGO":
-                op_state_int = int(data[1])
-                if op_state_int == 1:
-                    return {"preset": None, "fan_mode": FAN_LOW}
-                elif op_state_int == 2:
-                    return {"preset": None, "fan_mode": FAN_MEDIUM}
-                elif op_state_int == 3:
-                    return {"preset": None, "fan_mode": FAN_HIGH}
-                elif op_state_int == 4:
-                    return {"preset": None, "fan_mode": FAN_HIGHEST}
-                elif op_state_int == 5:
-                    return {"preset": PRESET_BOOST, "fan_mode": None}
-                elif op_state_int == 6:
-                    return {"preset": PRESET_NIGHT, "fan_mode": None}
-                elif op_state_int == 7:
-                    return {"preset": PRESET_COOLING, "fan_mode": None}
-                else:
-                    return None
-            return None
-        except (ConnectionError, IndexError, ValueError) as e:
+            values = self._parser.parse(raw_data)
+            if values.get("preset") is None and values.get("fan_mode") is None:
+                return None
+            return {"preset": values["preset"], "fan_mode": values["fan_mode"]}
+        except ConnectionError as e:
             _LOGGER.debug("Errore durante l'aggiornamento dello stato: %s", e)
             return None
 
-    async def set_cmv_mode(self, mode):
+    async def async_write(self, mode=None, leds_on: bool | None = None) -> bool:
+        """Scrive modalità e/o LED in un solo giro; False se il dispositivo rifiuta.
+
+        Solleva ConnectionError se il dispositivo non risponde.
+        """
+        cmds = []
+        if mode is not None:
+            cmds.append(MODE_CMDS[mode])
+        if leds_on is not None:
+            cmds.append(LED_ON_CMD if leds_on else LED_OFF_CMD)
+        exec_results = await self.execute_batch(cmds)
+        return all(exec_result == OK_REPLY for exec_result in exec_results)
+
+    async def set_cmv_mode(self, mode, leds_on: bool | None = None):
+        """Imposta velocità o preset; con leds_on ripristina anche i LED nello stesso giro."""
+        if mode not in MODE_CMDS:
+            return False
         try:
-            exec_result = await self._execute_cmv_cmd_async(MODE_CMDS.get(mode, NAME_CMD))
-            return exec_result == "OK"
+            return await self.async_write(mode, leds_on)
         except ConnectionError:
             return False
 
     async def are_cmv_leds_on(self):
         try:
-            led_state_int = None
             raw_data = await self._execute_cmv_cmd_async(CONFIG_GET_CMD)
-            data = raw_data.strip().split(',')
-            if data[0] == "VMGO":
-                led_state_int = int(data[2])
-            if led_state_int == 10:
-                return True
-            elif led_state_int == 0:
-                return False
-            else:
-                return None
-        except (ConnectionError, IndexError, ValueError):
+            return self._parser.parse(raw_data).get("leds_on")
+        except ConnectionError:
             return None
 
     async def turn_cmv_leds_off(self):
         exec_result = await self._execute_cmv_cmd_async(LED_OFF_CMD)
-        if exec_result == "OK":
+        if exec_result == OK_REPLY:
             return True
         return False
 
     async def turn_cmv_leds_on(self):
         exec_result = await self._execute_cmv_cmd_async(LED_ON_CMD)
-        if exec_result == "OK":
+        if exec_result == OK_REPLY:
             return True
         return False
 
     async def reset_cmv_filters(self):
         exec_result = await self._execute_cmv_cmd_async(RESET_FILTER)
-        if exec_result == "OK":
+        if exec_result == OK_REPLY:
             return True
         return False
\ No newline at end of file
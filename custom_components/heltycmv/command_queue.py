@@ -0,0 +1,139 @@
+"""Coda dei comandi verso un'unità Helty."""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from collections.abc import Awaitable, Callable
+import logging
+
+from .protocol import WRITE_PREFIX
+
+_LOGGER = logging.getLogger(__name__)
+
+READ_SUFFIX = b'?'
+# VMWH + due cifre di registro: due scritture sullo stesso registro si
+# sostituiscono, vale solo l'ultima.
+WRITE_KEY_LENGTH = 6
+# Comandi in coda inviati insieme sulla connessione
+MAX_BATCH = 4
+
+
+def _consume_exception(future: asyncio.Future) -> None:
+    if not future.cancelled():
+        future.exception()
+
+
+class _PendingCommand:
+    __slots__ = ("cmd", "future")
+
+    def __init__(self, cmd: bytes, future: asyncio.Future) -> None:
+        self.cmd = cmd
+        self.future = future
+
+
+class HeltyCommandQueue:
+    """Invia i comandi un lotto alla volta e accorpa quelli equivalenti.
+
+    I comandi accumulati mentre il dispositivo è occupato partono insieme, in
+    ordine, con una sola chiamata a execute. Le letture identiche in attesa
+    condividono un'unica risposta. Una scrittura ancora in coda viene
+    sostituita da una successiva sullo stesso registro, e chi attendeva la
+    prima riceve l'esito della seconda.
+    """
+
+    def __init__(self, execute: Callable[[list[bytes]], Awaitable[list[str]]]) -> None:
+        self._execute = execute
+        self._queue: deque[_PendingCommand] = deque()
+        self._reads: dict[bytes, _PendingCommand] = {}
+        self._writes: dict[bytes, _PendingCommand] = {}
+        self._worker: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        """Numero di comandi in coda, escluso quello in esecuzione."""
+        return len(self._queue)
+
+    async def submit(self, cmd: bytes) -> str:
+        """Accoda un comando e ne attende la risposta."""
+        return await asyncio.shield(self._add(cmd).future)
+
+    async def submit_many(self, cmds: list[bytes]) -> list[str]:
+        """Accoda più comandi insieme, così partono nello stesso lotto."""
+        futures = [asyncio.shield(self._add(cmd).future) for cmd in cmds]
+        return list(await asyncio.gather(*futures))
+
+    def _add(self, cmd: bytes) -> _PendingCommand:
+        if cmd.endswith(READ_SUFFIX):
+            pending = self._reads.get(cmd)
+            if pending is None:
+                pending = self._enqueue(cmd)
+                self._reads[cmd] = pending
+        elif cmd.startswith(WRITE_PREFIX):
+            key = cmd[:WRITE_KEY_LENGTH]
+            pending = self._writes.get(key)
+            if pending is None:
+                pending = self._enqueue(cmd)
+                self._writes[key] = pending
+            else:
+                _LOGGER.debug("Scrittura %s sostituita da %s", pending.cmd, cmd)
+                pending.cmd = cmd
+            # Le letture successive devono vedere l'effetto della scrittura
+            self._reads.clear()
+        else:
+            pending = self._enqueue(cmd)
+        return pending
+
+    async def close(self) -> None:
+        """Interrompe il worker e fa fallire i comandi ancora in coda."""
+        worker, self._worker = self._worker, None
+        if worker is not None:
+            worker.cancel()
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        while self._queue:
+            pending = self._queue.popleft()
+            if not pending.future.done():
+                pending.future.set_exception(ConnectionError("Coda comandi chiusa"))
+        self._reads.clear()
+        self._writes.clear()
+
+    def _enqueue(self, cmd: bytes) -> _PendingCommand:
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        pending = _PendingCommand(cmd, future)
+        self._queue.append(pending)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+        return pending
+
+    def _dequeue(self) -> _PendingCommand:
+        pending = self._queue.popleft()
+        if self._writes.get(pending.cmd[:WRITE_KEY_LENGTH]) is pending:
+            del self._writes[pending.cmd[:WRITE_KEY_LENGTH]]
+        return pending
+
+    async def _run(self) -> None:
+        while self._queue:
+            batch = [self._dequeue() for _ in range(min(len(self._queue), MAX_BATCH))]
+            try:
+                results = await self._execute([pending.cmd for pending in batch])
+            except asyncio.CancelledError:
+                self._finish(batch, ConnectionError("Coda comandi chiusa"))
+                raise
+            except Exception as err:  # pylint: disable=broad-except
+                self._finish(batch, err)
+            else:
+                self._finish(batch, None, results)
+
+    def _finish(self, batch, error: Exception | None, results=None) -> None:
+        for index, pending in enumerate(batch):
+            if self._reads.get(pending.cmd) is pending:
+                del self._reads[pending.cmd]
+            if pending.future.done():
+                continue
+            if error is not None:
+                pending.future.set_exception(error)
+            else:
+                pending.future.set_result(results[index])
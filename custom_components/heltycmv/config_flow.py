@@ -1,6 +1,7 @@
 """Config flow for Helty CMV integration."""
 from __future__ import annotations
 
+import ipaddress
 import logging
 from .cmv import HeltyCMV
 from typing import Any
@@ -8,10 +9,62 @@ from typing import Any
 import voluptuous as vol
 
 from homeassistant import config_entries
-from homeassistant.core import HomeAssistant
+from homeassistant.components.network import async_get_source_ip
+from homeassistant.const import CONF_HOST, CONF_NAME, CONF_PORT
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.data_entry_flow import FlowResult
 from homeassistant.exceptions import HomeAssistantError
-from .const import DOMAIN
+import homeassistant.helpers.config_validation as cv
+from homeassistant.util import dt as dt_util
+from .const import (
+    CONF_CMV_ID,
+    CONF_AUTO_BOOST,
+    CONF_BOOST_HUMIDITY,
+    CONF_BOOST_HYSTERESIS,
+    CONF_BOOST_MAX_DURATION,
+    CONF_BOOST_MIN_DURATION,
+    CONF_HOSTS,
+    CONF_SUBNET,
+    CONF_FAST_DURATION,
+    CONF_FAST_INTERVAL,
+    CONF_HUMIDITY_DEADBAND,
+    CONF_MAX_BACKOFF,
+    CONF_MAX_STALENESS,
+    CONF_NIGHT_END,
+    CONF_NIGHT_START,
+    CONF_PROXY_HOST,
+    CONF_PROXY_PORT,
+    CONF_PROXY_TTL,
+    CONF_PUSH_MODE,
+    CONF_HEARTBEAT_INTERVAL,
+    CONF_TREND_WINDOW,
+    CONF_SENSORS_INTERVAL,
+    CONF_STATUS_INTERVAL,
+    CONF_TEMPERATURE_DEADBAND,
+    CONF_UNIT_NAME,
+    DEFAULT_AUTO_BOOST,
+    DEFAULT_BOOST_HUMIDITY,
+    DEFAULT_BOOST_HYSTERESIS,
+    DEFAULT_BOOST_MAX_DURATION,
+    DEFAULT_BOOST_MIN_DURATION,
+    DEFAULT_FAST_DURATION,
+    DEFAULT_FAST_INTERVAL,
+    DEFAULT_HUMIDITY_DEADBAND,
+    DEFAULT_MAX_BACKOFF,
+    DEFAULT_MAX_STALENESS,
+    DEFAULT_PROXY_HOST,
+    DEFAULT_PROXY_PORT,
+    DEFAULT_PROXY_TTL,
+    DEFAULT_PUSH_MODE,
+    DEFAULT_HEARTBEAT_INTERVAL,
+    DEFAULT_TREND_WINDOW,
+    DEFAULT_PORT,
+    DEFAULT_SENSORS_INTERVAL,
+    DEFAULT_STATUS_INTERVAL,
+    DEFAULT_TEMPERATURE_DEADBAND,
+    DOMAIN,
+)
+from .discovery import HeltyDiscoveredUnit, async_scan
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -22,6 +75,80 @@ STEP_USER_DATA_SCHEMA = vol.Schema(
     }
 )
 
+NIGHT_WINDOW_KEYS = (CONF_NIGHT_START, CONF_NIGHT_END)
+
+
+def _valid_time(value: str) -> bool:
+    """Accept an HH:MM time, or an empty string to disable the night window."""
+    return not value or dt_util.parse_time(value) is not None
+
+
+def _ip_address(value: str) -> str | None:
+    """Normalize an IPv4 or IPv6 address for the proxy to listen on."""
+    try:
+        return str(ipaddress.ip_address(value))
+    except ValueError:
+        return None
+
+
+OPTIONS_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_SENSORS_INTERVAL, default=DEFAULT_SENSORS_INTERVAL): vol.All(
+            int, vol.Range(min=10)
+        ),
+        vol.Optional(CONF_STATUS_INTERVAL, default=DEFAULT_STATUS_INTERVAL): vol.All(
+            int, vol.Range(min=10)
+        ),
+        vol.Optional(CONF_FAST_INTERVAL, default=DEFAULT_FAST_INTERVAL): vol.All(
+            int, vol.Range(min=2)
+        ),
+        vol.Optional(CONF_FAST_DURATION, default=DEFAULT_FAST_DURATION): vol.All(
+            int, vol.Range(min=0)
+        ),
+        vol.Optional(CONF_MAX_BACKOFF, default=DEFAULT_MAX_BACKOFF): vol.All(
+            int, vol.Range(min=60)
+        ),
+        vol.Optional(CONF_MAX_STALENESS, default=DEFAULT_MAX_STALENESS): vol.All(
+            int, vol.Range(min=0)
+        ),
+        vol.Optional(CONF_PUSH_MODE, default=DEFAULT_PUSH_MODE): bool,
+        vol.Optional(CONF_HEARTBEAT_INTERVAL, default=DEFAULT_HEARTBEAT_INTERVAL): vol.All(
+            int, vol.Range(min=2)
+        ),
+        vol.Optional(CONF_TREND_WINDOW, default=DEFAULT_TREND_WINDOW): vol.All(
+            int, vol.Range(min=300, max=86400)
+        ),
+        vol.Optional(CONF_AUTO_BOOST, default=DEFAULT_AUTO_BOOST): bool,
+        vol.Optional(CONF_BOOST_HUMIDITY, default=DEFAULT_BOOST_HUMIDITY): vol.All(
+            vol.Coerce(float), vol.Range(min=30, max=100)
+        ),
+        vol.Optional(CONF_BOOST_HYSTERESIS, default=DEFAULT_BOOST_HYSTERESIS): vol.All(
+            vol.Coerce(float), vol.Range(min=0, max=30)
+        ),
+        vol.Optional(CONF_BOOST_MIN_DURATION, default=DEFAULT_BOOST_MIN_DURATION): vol.All(
+            int, vol.Range(min=0)
+        ),
+        vol.Optional(CONF_BOOST_MAX_DURATION, default=DEFAULT_BOOST_MAX_DURATION): vol.All(
+            int, vol.Range(min=60)
+        ),
+        vol.Optional(CONF_NIGHT_START, default=""): str,
+        vol.Optional(CONF_NIGHT_END, default=""): str,
+        vol.Optional(CONF_PROXY_PORT, default=DEFAULT_PROXY_PORT): vol.All(
+            int, vol.Range(min=0, max=65535)
+        ),
+        vol.Optional(CONF_PROXY_HOST, default=DEFAULT_PROXY_HOST): str,
+        vol.Optional(CONF_PROXY_TTL, default=DEFAULT_PROXY_TTL): vol.All(
+            vol.Coerce(float), vol.Range(min=0, max=300)
+        ),
+        vol.Optional(
+            CONF_TEMPERATURE_DEADBAND, default=DEFAULT_TEMPERATURE_DEADBAND
+        ): vol.All(vol.Coerce(float), vol.Range(min=0, max=5)),
+        vol.Optional(
+            CONF_HUMIDITY_DEADBAND, default=DEFAULT_HUMIDITY_DEADBAND
+        ): vol.All(vol.Coerce(float), vol.Range(min=0, max=10)),
+    }
+)
+
 
 async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> dict[str, Any]:
     """Validate the user input allows us to connect.
@@ -32,7 +159,10 @@ async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> dict[str,
 
     device = HeltyCMV(data["host"], data["port"])
 
-    cmv_name = await device.get_cmv_name()
+    try:
+        cmv_name = await device.get_cmv_name()
+    finally:
+        await device.async_close()
 
     _LOGGER.info("CMV Name {}".format(cmv_name))
 
@@ -40,7 +170,7 @@ async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> dict[str,
         raise CannotConnect
 
 
-    return {"title": cmv_name}
+    return {"title": cmv_name, CONF_UNIT_NAME: cmv_name}
 
 
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -48,12 +178,31 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
     VERSION = 1
 
+    def __init__(self) -> None:
+        """Initialize the flow."""
+        self._discovered: dict[str, HeltyDiscoveredUnit] = {}
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(
+        config_entry: config_entries.ConfigEntry,
+    ) -> OptionsFlowHandler:
+        """Get the options flow for this handler."""
+        return OptionsFlowHandler()
+
     async def async_step_user(
         self, user_input: dict[str, Any] | None = None
     ) -> FlowResult:
-        """Handle the initial step."""
+        """Let the user scan the network or enter a unit by hand."""
+        return self.async_show_menu(step_id="user", menu_options=["discover", "manual"])
+
+    async def async_step_manual(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Handle a unit entered by host and port."""
         errors: dict[str, str] = {}
         if user_input is not None:
+            self._async_abort_entries_match({CONF_HOST: user_input[CONF_HOST]})
             try:
                 info = await validate_input(self.hass, user_input)
             except CannotConnect:
@@ -64,12 +213,136 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 _LOGGER.exception("Unexpected exception")
                 errors["base"] = "unknown"
             else:
-                return self.async_create_entry(title=info["title"], data=user_input)
+                return self.async_create_entry(
+                    title=info["title"],
+                    data={
+                        **user_input,
+                        CONF_UNIT_NAME: info[CONF_UNIT_NAME],
+                        CONF_CMV_ID: user_input[CONF_HOST].lower(),
+                    },
+                )
 
         return self.async_show_form(
-            step_id="user", data_schema=STEP_USER_DATA_SCHEMA, errors=errors
+            step_id="manual", data_schema=STEP_USER_DATA_SCHEMA, errors=errors
         )
 
+    async def async_step_discover(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Scan a subnet for units answering the name command."""
+        errors: dict[str, str] = {}
+        if user_input is not None:
+            configured = {
+                entry.data[CONF_HOST] for entry in self._async_current_entries()
+            }
+            try:
+                units = await async_scan(
+                    user_input[CONF_SUBNET], user_input[CONF_PORT], exclude=configured
+                )
+            except ValueError:
+                errors[CONF_SUBNET] = "invalid_subnet"
+            else:
+                if units:
+                    self._discovered = {unit.host: unit for unit in units}
+                    return await self.async_step_pick()
+                errors["base"] = "no_units_found"
+        else:
+            source_ip = await async_get_source_ip(self.hass)
+            user_input = {
+                CONF_SUBNET: f"{source_ip}/24" if source_ip else "",
+                CONF_PORT: DEFAULT_PORT,
+            }
+
+        return self.async_show_form(
+            step_id="discover",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(CONF_SUBNET, default=user_input[CONF_SUBNET]): str,
+                    vol.Required(CONF_PORT, default=user_input[CONF_PORT]): int,
+                }
+            ),
+            errors=errors,
+        )
+
+    async def async_step_pick(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Add the units picked among the discovered ones."""
+        if user_input is not None and user_input[CONF_HOSTS]:
+            first, *others = (self._discovered[host] for host in user_input[CONF_HOSTS])
+            # Every further unit gets its own flow, and its own config entry
+            for unit in others:
+                self.hass.async_create_task(
+                    self.hass.config_entries.flow.async_init(
+                        DOMAIN,
+                        context={"source": config_entries.SOURCE_INTEGRATION_DISCOVERY},
+                        data=_unit_data(unit),
+                    )
+                )
+            return await self.async_step_integration_discovery(_unit_data(first))
+
+        options = {
+            host: f"{unit.name} ({host})" for host, unit in self._discovered.items()
+        }
+        return self.async_show_form(
+            step_id="pick",
+            data_schema=vol.Schema(
+                {vol.Required(CONF_HOSTS, default=list(options)): cv.multi_select(options)}
+            ),
+            description_placeholders={"count": str(len(options))},
+        )
+
+    async def async_step_integration_discovery(
+        self, discovery_info: dict[str, Any]
+    ) -> FlowResult:
+        """Create the entry of a unit picked from a network scan."""
+        self._async_abort_entries_match({CONF_HOST: discovery_info[CONF_HOST]})
+        return self.async_create_entry(
+            title=discovery_info[CONF_NAME],
+            data={
+                CONF_HOST: discovery_info[CONF_HOST],
+                CONF_PORT: discovery_info[CONF_PORT],
+                CONF_UNIT_NAME: discovery_info[CONF_NAME],
+                CONF_CMV_ID: discovery_info[CONF_HOST].lower(),
+            },
+        )
+
+
+class OptionsFlowHandler(config_entries.OptionsFlow):
+    """Handle the polling cadence options for Helty CMV."""
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Manage the polling options."""
+        errors: dict[str, str] = {}
+        if user_input is not None:
+            # Plain strings in the schema: HA cannot serialize custom validators
+            for key in NIGHT_WINDOW_KEYS:
+                user_input[key] = user_input.get(key, "").strip()
+                if not _valid_time(user_input[key]):
+                    errors[key] = "invalid_time"
+            if CONF_PROXY_HOST in user_input:
+                proxy_host = _ip_address(user_input[CONF_PROXY_HOST].strip())
+                if proxy_host is None:
+                    errors[CONF_PROXY_HOST] = "invalid_address"
+                else:
+                    user_input[CONF_PROXY_HOST] = proxy_host
+            if not errors:
+                return self.async_create_entry(data=user_input)
+
+        return self.async_show_form(
+            step_id="init",
+            data_schema=self.add_suggested_values_to_schema(
+                OPTIONS_SCHEMA, user_input or self.config_entry.options
+            ),
+            errors=errors,
+        )
+
+
+def _unit_data(unit: HeltyDiscoveredUnit) -> dict[str, Any]:
+    return {CONF_HOST: unit.host, CONF_PORT: unit.port, CONF_NAME: unit.name}
+
 
 class CannotConnect(HomeAssistantError):
     """Error to indicate we cannot connect."""
@@ -0,0 +1,342 @@
+"""Connessione TCP persistente verso un'unità Helty."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+import logging
+import time
+
+from .protocol import HeltyFrameBuffer, expected_header, is_known_header
+from .resilience import retry_safe
+from .stats import HeltyDeviceStats
+
+_LOGGER = logging.getLogger(__name__)
+
+READ_SIZE = 1024
+RECONNECT_BACKOFF_MIN = 1.0
+RECONNECT_BACKOFF_MAX = 30.0
+# Dopo quante chiusure consecutive del socket inattivo da parte del
+# dispositivo si torna a una connessione per comando.
+IDLE_DROP_LIMIT = 3
+# Attesa massima per ogni risposta della prima pipeline: se non arrivano il
+# firmware non gestisce i comandi accodati.
+PIPELINE_REPLY_TIMEOUT = 1.0
+
+
+class _PeerClosed(Exception):
+    """Il dispositivo ha chiuso il socket prima di rispondere a tutti i comandi."""
+
+    def __init__(self, replies: list[bytes]) -> None:
+        super().__init__()
+        self.replies = replies
+
+
+class _UnexpectedFrame(Exception):
+    """Risposta che non appartiene al protocollo."""
+
+
+class _PipelineRejected(_PeerClosed):
+    """Il firmware non risponde ai comandi inviati in pipeline."""
+
+
+class HeltyConnection:
+    """Socket mantenuto aperto tra un comando e l'altro.
+
+    La connessione viene aperta al primo comando e riutilizzata finché il
+    dispositivo non la chiude. Se il firmware chiude sistematicamente le
+    connessioni inattive si ripiega su una connessione per comando.
+
+    Un solo task legge il socket: durante una richiesta i byte vanno a chi
+    attende la risposta, tra una richiesta e l'altra le risposte che il
+    dispositivo invia di sua iniziativa vanno subito a unsolicited_callback.
+    """
+
+    def __init__(self, host: str, port: int, stats: HeltyDeviceStats | None = None) -> None:
+        self._host = host
+        self._port = port
+        self.stats = stats or HeltyDeviceStats()
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._frames = HeltyFrameBuffer()
+        self._listener: asyncio.Task | None = None
+        # Byte letti dal listener mentre una richiesta è in corso
+        self._chunks: asyncio.Queue[bytes] = asyncio.Queue()
+        self._exchanging = False
+        self._lock = asyncio.Lock()
+        self._backoff = 0.0
+        self._next_connect_at = 0.0
+        self._idle_drops = 0
+        self.persistent = True
+        # True se l'ultima richiesta ha scritto qualcosa sul socket
+        self.request_sent = False
+        # None finché non si sa se il firmware accetta comandi in pipeline
+        self.pipelining: bool | None = None
+        # Chiamata con le risposte note arrivate senza essere state richieste
+        self.unsolicited_callback: Callable[[bytes], None] | None = None
+
+    @property
+    def connected(self) -> bool:
+        """True se c'è un socket aperto e non chiuso dal dispositivo."""
+        return (
+            self._writer is not None
+            and not self._writer.is_closing()
+            and not self._reader.at_eof()
+        )
+
+    @property
+    def reconnect_delay(self) -> float:
+        """Secondi prima che sia consentito un nuovo tentativo di connessione."""
+        if self._writer is not None:
+            return 0.0
+        return max(self._next_connect_at - time.monotonic(), 0.0)
+
+    async def execute(self, cmd: bytes) -> bytes:
+        """Invia un comando e restituisce il frame di risposta, senza terminatore."""
+        return (await self.execute_batch((cmd,)))[0]
+
+    async def execute_batch(self, cmds: tuple[bytes, ...] | list[bytes]) -> list[bytes]:
+        """Invia più comandi sulla stessa connessione, risposte nello stesso ordine."""
+        async with self._lock:
+            self.request_sent = False
+            # Da qui i byte in arrivo appartengono alla richiesta
+            self._exchanging = True
+            if self.persistent and self._writer is not None and not self.connected:
+                # Il dispositivo ha chiuso il socket mentre era inattivo
+                self._register_idle_drop()
+                await self._disconnect()
+
+            replies: list[bytes] = []
+            try:
+                while len(replies) < len(cmds):
+                    reused = self._writer is not None
+                    if not reused:
+                        await self._connect()
+                    try:
+                        replies += await self._exchange(cmds[len(replies):])
+                    except _PeerClosed as err:
+                        replies += err.replies
+                        await self._disconnect()
+                        if self.request_sent and not retry_safe(cmds[len(replies):]):
+                            # Il comando potrebbe essere già arrivato: non va ripetuto
+                            raise ConnectionError(
+                                "Connessione chiusa dal dispositivo durante una scrittura"
+                            ) from None
+                        self.stats.retries += 1
+                        if isinstance(err, _PipelineRejected):
+                            continue
+                        if not err.replies and not reused:
+                            raise ConnectionError("Connessione chiusa dal dispositivo") from None
+                        # Socket semiaperto, o firmware che chiude dopo ogni
+                        # risposta: si prosegue su una connessione nuova. Non
+                        # conta come chiusura del socket inattivo, che si
+                        # rileva solo prima di inviare.
+                    else:
+                        if reused:
+                            self._idle_drops = 0
+            finally:
+                self._exchanging = False
+                if not self.persistent:
+                    await self._disconnect()
+                else:
+                    # Quanto arrivato dopo l'ultima risposta non era richiesto
+                    while not self._chunks.empty():
+                        self._frames.feed(self._chunks.get_nowait())
+                    self._dispatch_unsolicited()
+            return replies
+
+    async def close(self) -> None:
+        """Chiude il socket, se aperto."""
+        async with self._lock:
+            await self._disconnect()
+
+    async def _exchange(self, cmds) -> list[bytes]:
+        """Scambia i comandi sul socket aperto, in pipeline se possibile."""
+        if len(cmds) > 1 and self.pipelining is not False:
+            return await self._exchange_pipelined(cmds)
+        replies: list[bytes] = []
+        for cmd in cmds:
+            start = time.monotonic()
+            frame = await self._send(cmd) if self._writer is not None else b''
+            if not frame:
+                raise _PeerClosed(replies)
+            self.stats.record_rtt(cmd, time.monotonic() - start)
+            replies.append(frame)
+        return replies
+
+    async def _exchange_pipelined(self, cmds) -> list[bytes]:
+        replies: list[bytes] = []
+        start = time.monotonic()
+        try:
+            self.request_sent = True
+            self._writer.write(b''.join(cmds))
+            await self._writer.drain()
+            for cmd in cmds:
+                header = expected_header(cmd)
+                if self.pipelining:
+                    frame = await self._read_frame(header)
+                else:
+                    # Prima pipeline sul dispositivo: ogni risposta deve
+                    # corrispondere al comando e, dopo la prima, arrivare presto
+                    try:
+                        async with asyncio.timeout(PIPELINE_REPLY_TIMEOUT if replies else None):
+                            frame = await self._read_frame(header, strict=True)
+                    except (TimeoutError, _UnexpectedFrame):
+                        self._disable_pipelining()
+                        raise _PipelineRejected(replies) from None
+                if not frame:
+                    raise _PeerClosed(replies)
+                self.stats.record_rtt(cmd, time.monotonic() - start)
+                replies.append(frame)
+        except _PeerClosed:
+            raise
+        except BaseException:
+            # Stato del socket sconosciuto (timeout, errore, cancellazione)
+            self._abort()
+            raise
+        if self.pipelining is None:
+            _LOGGER.debug("Helty %s accetta comandi in pipeline", self._host)
+            self.pipelining = True
+        return replies
+
+    def _disable_pipelining(self) -> None:
+        _LOGGER.info(
+            "Helty %s non risponde ai comandi in pipeline, uso richiesta/risposta",
+            self._host,
+        )
+        self.pipelining = False
+
+    def _register_idle_drop(self) -> None:
+        self._idle_drops += 1
+        if self._idle_drops >= IDLE_DROP_LIMIT and self.persistent:
+            _LOGGER.info(
+                "Helty %s chiude le connessioni inattive, uso una connessione per comando",
+                self._host,
+            )
+            self.persistent = False
+
+    async def _connect(self) -> None:
+        now = time.monotonic()
+        if now < self._next_connect_at:
+            raise ConnectionError(
+                f"Riconnessione a {self._host} rimandata di {self._next_connect_at - now:.1f}s"
+            )
+        start = time.monotonic()
+        try:
+            self._reader, self._writer = await asyncio.open_connection(self._host, self._port)
+        except OSError:
+            self.stats.connect_failures += 1
+            self._backoff = min(
+                max(self._backoff * 2, RECONNECT_BACKOFF_MIN), RECONNECT_BACKOFF_MAX
+            )
+            self._next_connect_at = time.monotonic() + self._backoff
+            raise
+        self.stats.connect.observe(time.monotonic() - start)
+        self._backoff = 0.0
+        self._next_connect_at = 0.0
+        self._listener = asyncio.get_running_loop().create_task(self._listen(self._reader))
+
+    async def _listen(self, reader: asyncio.StreamReader) -> None:
+        """Legge il socket finché resta aperto."""
+        while True:
+            try:
+                chunk = await reader.read(READ_SIZE)
+            except OSError:
+                chunk = b''
+            if self._exchanging:
+                self._chunks.put_nowait(chunk)
+            elif chunk:
+                self._frames.feed(chunk)
+                self._dispatch_unsolicited()
+            if not chunk:
+                return
+
+    def _dispatch_unsolicited(self) -> None:
+        """Consegna le risposte complete arrivate senza una richiesta in corso."""
+        while (frame := self._frames.pop_frame()) is not None:
+            self._unsolicited(frame)
+
+    def _unsolicited(self, frame: bytes) -> None:
+        if self.unsolicited_callback is not None and is_known_header(frame):
+            self.unsolicited_callback(frame)
+            return
+        _LOGGER.debug("Risposta inattesa da %s scartata: %s", self._host, frame)
+
+    async def _send(self, cmd: bytes) -> bytes:
+        """Invia il comando e legge il frame corrispondente.
+
+        Restituisce b'' se il dispositivo chiude il socket prima di rispondere.
+        """
+        try:
+            self.request_sent = True
+            self._writer.write(cmd)
+            await self._writer.drain()
+            return await self._read_frame(expected_header(cmd))
+        except BaseException:
+            # Stato del socket sconosciuto (timeout, errore, cancellazione)
+            self._abort()
+            raise
+
+    async def _read_frame(self, header: bytes | None, strict: bool = False) -> bytes:
+        """Legge fino a ottenere la risposta con l'intestazione attesa.
+
+        Le risposte note ma destinate a un'altra richiesta vengono scartate.
+        Con strict qualunque risposta diversa da quella attesa solleva
+        _UnexpectedFrame.
+        """
+        partial = False
+        while True:
+            frame = self._frames.pop_frame()
+            if frame is None:
+                if self._frames and not partial:
+                    # Arrivata solo una parte della risposta
+                    partial = True
+                    self.stats.partial_reads += 1
+                chunk = await self._read_chunk()
+                if chunk:
+                    self._frames.feed(chunk)
+                    continue
+                # Fine dello stream: vale quanto già ricevuto, se plausibile.
+                # Il socket non va più usato, né i byte rimasti nel buffer.
+                frame = self._frames.flush()
+                self._abort()
+                if frame is None:
+                    return b''
+            if header is None or frame.startswith(header):
+                return frame
+            if strict:
+                raise _UnexpectedFrame(frame)
+            if not is_known_header(frame):
+                return frame
+            self._unsolicited(frame)
+
+    async def _read_chunk(self) -> bytes:
+        """Altri byte dal listener; b'' a fine stream o se il socket è già stato chiuso."""
+        if self._chunks.empty() and (self._listener is None or self._listener.done()):
+            return b''
+        return await self._chunks.get()
+
+    def _reset(self) -> asyncio.StreamWriter | None:
+        """Dimentica il socket attuale e i byte non ancora consumati."""
+        writer = self._writer
+        self._reader = self._writer = None
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        self._chunks = asyncio.Queue()
+        self._frames.clear()
+        return writer
+
+    def _abort(self) -> None:
+        writer = self._reset()
+        if writer is not None:
+            writer.close()
+
+    async def _disconnect(self) -> None:
+        writer = self._reset()
+        if writer is None:
+            return
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
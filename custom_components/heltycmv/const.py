@@ -27,3 +27,57 @@ MODE_CMDS = {
     PRESET_NIGHT: b'VMWH0000006',
     PRESET_COOLING: b'VMWH0000007',
 }
+CONF_SENSORS_INTERVAL = 'sensors_interval'
+CONF_STATUS_INTERVAL = 'status_interval'
+CONF_FAST_INTERVAL = 'fast_interval'
+CONF_FAST_DURATION = 'fast_duration'
+CONF_MAX_BACKOFF = 'max_backoff'
+CONF_TEMPERATURE_DEADBAND = 'temperature_deadband'
+CONF_HUMIDITY_DEADBAND = 'humidity_deadband'
+CONF_MAX_STALENESS = 'max_staleness'
+CONF_PUSH_MODE = 'push_mode'
+CONF_HEARTBEAT_INTERVAL = 'heartbeat_interval'
+CONF_TREND_WINDOW = 'trend_window'
+CONF_AUTO_BOOST = 'auto_boost'
+CONF_BOOST_HUMIDITY = 'boost_humidity'
+CONF_BOOST_HYSTERESIS = 'boost_hysteresis'
+CONF_BOOST_MIN_DURATION = 'boost_min_duration'
+CONF_BOOST_MAX_DURATION = 'boost_max_duration'
+CONF_NIGHT_START = 'night_start'
+CONF_NIGHT_END = 'night_end'
+CONF_PROXY_HOST = 'proxy_host'
+CONF_PROXY_PORT = 'proxy_port'
+CONF_PROXY_TTL = 'proxy_ttl'
+DEFAULT_SENSORS_INTERVAL = 180
+DEFAULT_STATUS_INTERVAL = 60
+DEFAULT_FAST_INTERVAL = 10
+DEFAULT_FAST_DURATION = 120
+DEFAULT_MAX_BACKOFF = 900
+DEFAULT_TEMPERATURE_DEADBAND = 0.0
+DEFAULT_HUMIDITY_DEADBAND = 0.0
+DEFAULT_MAX_STALENESS = 900
+DEFAULT_PUSH_MODE = False
+DEFAULT_HEARTBEAT_INTERVAL = 5
+DEFAULT_TREND_WINDOW = 3600
+DEFAULT_AUTO_BOOST = False
+DEFAULT_BOOST_HUMIDITY = 70.0
+DEFAULT_BOOST_HYSTERESIS = 5.0
+DEFAULT_BOOST_MIN_DURATION = 300
+DEFAULT_BOOST_MAX_DURATION = 1800
+# Local proxy disabled unless a port is set
+DEFAULT_PROXY_PORT = 0
+# Only local clients unless another bind address is configured
+DEFAULT_PROXY_HOST = '127.0.0.1'
+DEFAULT_PROXY_TTL = 5
+DEFAULT_HUB_CONCURRENCY = 4
+# TCP port of the Wi-Fi module on Helty Flow units
+DEFAULT_PORT = 5001
+CONF_SUBNET = 'subnet'
+CONF_HOSTS = 'hosts'
+# Stable identity of a unit: VMNM name and the id its entities are keyed by
+CONF_UNIT_NAME = 'unit_name'
+CONF_CMV_ID = 'cmv_id'
+DATA_HUB = 'heltycmv_hub'
+SERVICE_APPLY_FLEET = 'apply_fleet'
+ATTR_MODE = 'mode'
+ATTR_LEDS_ON = 'leds_on'
@@ -1,53 +1,714 @@
-import asyncio
 import logging
+import time
+from collections.abc import Mapping
+from dataclasses import asdict, fields, replace
 from datetime import timedelta
+from typing import Any
+from homeassistant.const import CONF_HOST
+from homeassistant.core import callback
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
+from .boost import HeltyBoostController
+from .cache import HeltySnapshotCache
+from .capabilities import HeltyCapabilities
 from .cmv import HeltyCMV
+from .const import (
+    CONF_AUTO_BOOST,
+    CONF_BOOST_HUMIDITY,
+    CONF_BOOST_HYSTERESIS,
+    CONF_BOOST_MAX_DURATION,
+    CONF_BOOST_MIN_DURATION,
+    CONF_FAST_DURATION,
+    CONF_FAST_INTERVAL,
+    CONF_HEARTBEAT_INTERVAL,
+    CONF_HUMIDITY_DEADBAND,
+    CONF_MAX_BACKOFF,
+    CONF_MAX_STALENESS,
+    CONF_NIGHT_END,
+    CONF_NIGHT_START,
+    CONF_PROXY_HOST,
+    CONF_PROXY_PORT,
+    CONF_PROXY_TTL,
+    CONF_PUSH_MODE,
+    CONF_SENSORS_INTERVAL,
+    CONF_STATUS_INTERVAL,
+    CONF_TEMPERATURE_DEADBAND,
+    CONF_TREND_WINDOW,
+    DEFAULT_AUTO_BOOST,
+    DEFAULT_BOOST_HUMIDITY,
+    DEFAULT_BOOST_HYSTERESIS,
+    DEFAULT_BOOST_MAX_DURATION,
+    DEFAULT_BOOST_MIN_DURATION,
+    DEFAULT_FAST_DURATION,
+    DEFAULT_FAST_INTERVAL,
+    DEFAULT_HEARTBEAT_INTERVAL,
+    DEFAULT_HUMIDITY_DEADBAND,
+    DEFAULT_MAX_BACKOFF,
+    DEFAULT_MAX_STALENESS,
+    DEFAULT_PROXY_HOST,
+    DEFAULT_PROXY_PORT,
+    DEFAULT_PROXY_TTL,
+    DEFAULT_PUSH_MODE,
+    DEFAULT_SENSORS_INTERVAL,
+    DEFAULT_STATUS_INTERVAL,
+    DEFAULT_TEMPERATURE_DEADBAND,
+    DEFAULT_TREND_WINDOW,
+    DOMAIN,
+    MODE_CMDS,
+    PRESET_BOOST,
+)
+from .discovery import async_scan, host_network
+from .parser import HeltyCMVSnapshot, mode_state
+from .proxy import HeltyProxyServer
+from .reconcile import HeltyDesiredState
+from .scheduler import HeltyPollScheduler
+from .timeseries import HeltyRollingSeries, trend_capacity
 
 _LOGGER = logging.getLogger(__name__)
 
+# Attesa prima di rileggere lo stato dopo uno o più comandi ravvicinati
+VERIFY_COOLDOWN = 3
+# Versione dei dati salvati e ritardo con cui vengono scritti su disco
+STORAGE_VERSION = 1
+STORE_SAVE_DELAY = 60
+# Polling falliti di fila dopo i quali si cerca l'unità su un altro indirizzo,
+# attesa minima tra due ricerche e connessioni aperte in parallelo
+RELOCATE_AFTER_FAILURES = 5
+RELOCATE_INTERVAL = 1800
+RELOCATE_CONCURRENCY = 16
+# Attesa prima di ripetere una verifica delle funzioni rimasta senza risposta,
+# e tra due nuove verifiche di un'unità a cui manca qualche comando o campo
+PROBE_RETRY_INTERVAL = 600
+UNSUPPORTED_RECHECK_INTERVAL = 3600
+# Letture di fila con un formato diverso da quello verificato prima di ripetere
+# la verifica: una risposta troncata o sporca non basta
+CAPABILITY_MISMATCH_LIMIT = 3
+SNAPSHOT_FIELDS = tuple(field.name for field in fields(HeltyCMVSnapshot))
+# Opzione con la banda morta di ciascun campo numerico
+DEADBAND_OPTIONS = {
+    "indoor_temp": (CONF_TEMPERATURE_DEADBAND, DEFAULT_TEMPERATURE_DEADBAND),
+    "outdoor_temp": (CONF_TEMPERATURE_DEADBAND, DEFAULT_TEMPERATURE_DEADBAND),
+    "indoor_humidity": (CONF_HUMIDITY_DEADBAND, DEFAULT_HUMIDITY_DEADBAND),
+}
+# Campi di cui si tiene la serie recente, e contesto delle entità che la mostrano
+TREND_FIELDS = ("indoor_temp", "outdoor_temp", "indoor_humidity")
+TREND_SUFFIX = "_trend"
+_UNSET = object()
 
-class HeltyDataUpdateCoordinator(DataUpdateCoordinator):
+
+class HeltyDataUpdateCoordinator(DataUpdateCoordinator[HeltyCMVSnapshot]):
     """Coordinator per gestire il polling dei dati dal dispositivo Helty."""
 
-    def __init__(self, hass, device: HeltyCMV):
-        """Inizializza il coordinator."""
+    def __init__(
+        self,
+        hass,
+        device: HeltyCMV,
+        options: Mapping[str, Any] | None = None,
+        store_key: str | None = None,
+        unit_name: str | None = None,
+    ):
+        """Inizializza il coordinator.
+
+        Con store_key l'ultima istantanea valida viene salvata nello storage
+        di Home Assistant e può essere ripristinata all'avvio. Con unit_name
+        (il nome VMNM) l'unità viene cercata sulla sottorete se smette di
+        rispondere al suo indirizzo.
+        """
         self.device = device
+        self.unit_name = unit_name
+        self._relocating = False
+        self._relocated_at: float | None = None
+        self._probing = False
+        self._probed_at: float | None = None
+        self._mismatches = 0
+        self._store = Store(hass, STORAGE_VERSION, store_key) if store_key else None
+        # Ora (non monotona) dell'ultima lettura riuscita, salvata con l'istantanea
+        self._read_at = 0.0
+        options = options or {}
+        sensors_interval = options.get(CONF_SENSORS_INTERVAL, DEFAULT_SENSORS_INTERVAL)
+        status_interval = options.get(CONF_STATUS_INTERVAL, DEFAULT_STATUS_INTERVAL)
+        fast_interval = options.get(CONF_FAST_INTERVAL, DEFAULT_FAST_INTERVAL)
+        self._push = options.get(CONF_PUSH_MODE, DEFAULT_PUSH_MODE)
+        self._heartbeat_interval = options.get(CONF_HEARTBEAT_INTERVAL, DEFAULT_HEARTBEAT_INTERVAL)
+        self._unsub_heartbeat = None
+        if self._push:
+            # Lo stato operativo arriva dal heartbeat: il polling completo
+            # resta solo come ripiego, alla cadenza dei sensori
+            status_interval = fast_interval = max(status_interval, sensors_interval)
+        self._scheduler = HeltyPollScheduler(
+            sensors_interval=sensors_interval,
+            status_interval=status_interval,
+            fast_interval=fast_interval,
+            fast_duration=options.get(CONF_FAST_DURATION, DEFAULT_FAST_DURATION),
+            max_backoff=options.get(CONF_MAX_BACKOFF, DEFAULT_MAX_BACKOFF),
+            # Il boost automatico decide sull'umidità: va letta a ogni polling veloce
+            fast_sensors=options.get(CONF_AUTO_BOOST, DEFAULT_AUTO_BOOST),
+        )
+        # Variazioni entro la banda morta non vengono notificate alle entità
+        self._deadbands = {
+            field: options.get(key, default)
+            for field, (key, default) in DEADBAND_OPTIONS.items()
+        }
+        # Ultimi valori validi, serviti per max_staleness se il dispositivo non risponde
+        self._cache = HeltySnapshotCache(options.get(CONF_MAX_STALENESS, DEFAULT_MAX_STALENESS))
+        self._notified: dict[str, Any] = {}
+        self._notified_available: bool | None = None
+        self._notified_stale = False
+        # Serie recenti dei valori letti davvero (non quelli in cache)
+        trend_window = options.get(CONF_TREND_WINDOW, DEFAULT_TREND_WINDOW)
+        capacity = trend_capacity(trend_window, sensors_interval)
+        self.trends = {
+            field: HeltyRollingSeries(capacity, trend_window) for field in TREND_FIELDS
+        }
+        self._sampled: set[str] = set()
+        # Boost automatico sull'umidità, se abilitato nelle opzioni
+        self.boost: HeltyBoostController | None = None
+        if options.get(CONF_AUTO_BOOST, DEFAULT_AUTO_BOOST):
+            self.boost = HeltyBoostController(
+                on_humidity=options.get(CONF_BOOST_HUMIDITY, DEFAULT_BOOST_HUMIDITY),
+                hysteresis=options.get(CONF_BOOST_HYSTERESIS, DEFAULT_BOOST_HYSTERESIS),
+                min_duration=options.get(CONF_BOOST_MIN_DURATION, DEFAULT_BOOST_MIN_DURATION),
+                max_duration=options.get(CONF_BOOST_MAX_DURATION, DEFAULT_BOOST_MAX_DURATION),
+                night_start=dt_util.parse_time(options.get(CONF_NIGHT_START) or ""),
+                night_end=dt_util.parse_time(options.get(CONF_NIGHT_END) or ""),
+            )
+        self._boost_writing = False
+        # Modalità e LED richiesti, riapplicati se il dispositivo non li ha ricevuti
+        self.desired = HeltyDesiredState()
+        self._reconciling = False
+        # Proxy locale per gli altri client dell'unità, se abilitato
+        self.proxy: HeltyProxyServer | None = None
+        if proxy_port := options.get(CONF_PROXY_PORT, DEFAULT_PROXY_PORT):
+            self.proxy = HeltyProxyServer(
+                device,
+                proxy_port,
+                ttl=options.get(CONF_PROXY_TTL, DEFAULT_PROXY_TTL),
+                host=options.get(CONF_PROXY_HOST, DEFAULT_PROXY_HOST),
+                on_write=self._async_external_write,
+            )
         super().__init__(
             hass,
             _LOGGER,
             name=f"Helty {device.name}",
-            update_interval=timedelta(seconds=60),  # Polling ogni 60 secondi
+            # Il prossimo polling viene ricalcolato dallo scheduler dopo ogni lettura
+            update_interval=timedelta(seconds=self._scheduler.status_interval),
+            always_update=False,
+        )
+        self._verify_debouncer = Debouncer(
+            hass,
+            _LOGGER,
+            cooldown=VERIFY_COOLDOWN,
+            immediate=False,
+            function=self._async_verify_state,
         )
 
-    async def _async_update_data(self):
+    async def _async_update_data(self) -> HeltyCMVSnapshot:
         """Funzione che esegue il polling."""
+        now = time.monotonic()
+        # Solo i comandi in scadenza: VMGI? e/o VMGH?
+        sensors, status = self._scheduler.due(now)
+        if self.data is None:
+            sensors = status = True
         try:
-            (
-                op_status,
-                indoor_temp,
-                outdoor_temp,
-                indoor_humidity,
-                leds_on,
-            ) = await asyncio.gather(
-                self.device.get_cmv_op_status(),
-                self.device.get_cmv_indoor_air_temperature(),
-                self.device.get_cmv_outdoor_air_temperature(),
-                self.device.get_cmv_indoor_humidity(),
-                self.device.are_cmv_leds_on(),
+            data = await self.device.async_get_snapshot(self.data, sensors=sensors, config=status)
+        except ConnectionError as err:
+            self._scheduler.record_failure()
+            self._cache.record_failure(now)
+            self._async_reschedule(now)
+            self._async_maybe_relocate(now)
+            if self.data is not None and self._cache.servable(now):
+                # Le entità continuano a mostrare gli ultimi valori validi
+                _LOGGER.debug("Helty %s non risponde, uso i valori in cache: %s", self.device.name, err)
+                self._async_set_data(self.data)
+                return self.data
+            raise UpdateFailed(f"Errore di comunicazione con Helty: {err}") from err
+        self._scheduler.record_poll(now, sensors, status)
+        self._scheduler.boost_active = data.preset == PRESET_BOOST
+        self._cache.record(self.device.read_fields, now)
+        self._async_sample(data, now)
+        was_stale = self._cache.stale
+        self._cache.record_success()
+        self._async_reschedule(now)
+        if was_stale or (self._sampled and data == self.data):
+            # Anche se i dati non cambiano va tolta l'età dagli attributi e
+            # vanno aggiornati gli aggregati delle serie
+            self._async_set_data(data)
+        self._async_run_boost(data)
+        self._async_schedule_save()
+        self._async_check_capabilities(data)
+        self._async_maybe_probe(now)
+        if self.desired.expire(now):
+            _LOGGER.info("Helty %s: scartati i comandi rimasti in attesa troppo a lungo", self.device.name)
+        if self.desired.pending and not self._reconciling:
+            _LOGGER.debug("Helty %s risponde, riapplico lo stato richiesto", self.device.name)
+            # self.data non è ancora aggiornato: il confronto va fatto con data
+            self.hass.async_create_task(self._async_reconcile(data))
+        return data
+
+    async def async_restore(self) -> bool:
+        """Riparte dall'ultima istantanea salvata, senza interrogare il dispositivo.
+
+        I valori sono serviti come in cache, con la loro età reale, finché
+        il primo polling non va a buon fine. False se non c'è nulla da
+        ripristinare.
+        """
+        if self._store is None:
+            return False
+        stored = await self._store.async_load()
+        if stored and stored.get("capabilities"):
+            self.device.capabilities = HeltyCapabilities.from_dict(stored["capabilities"])
+        if not stored or not stored.get("snapshot"):
+            return False
+        values = {
+            field: tuple(value) if isinstance(value, list) else value
+            for field, value in stored["snapshot"].items()
+            if field in SNAPSHOT_FIELDS
+        }
+        now = time.monotonic()
+        age = max(time.time() - stored.get("saved_at", 0), 0)
+        self.data = HeltyCMVSnapshot(**values)
+        self._cache.record(
+            (field for field, value in values.items() if value not in (None, ())), now - age
+        )
+        self._cache.record_failure(now)
+        _LOGGER.debug("Helty %s: ripristinato lo stato salvato %.0fs fa", self.device.name, age)
+        return True
+
+    async def async_probe_capabilities(self, recheck: bool = False) -> bool:
+        """Verifica una volta le funzioni dell'unità e le salva.
+
+        Non interroga il dispositivo se la verifica è già nello storage,
+        salvo con recheck. True se le entità da creare sono cambiate
+        rispetto a prima.
+        """
+        previous = self.device.capabilities
+        if previous.probed and not recheck:
+            return False
+        self._probed_at = time.monotonic()
+        capabilities = await self.device.async_probe_capabilities()
+        if capabilities is None:
+            _LOGGER.debug("Helty %s non risponde, verifica delle funzioni rimandata", self.device.name)
+            return False
+        _LOGGER.debug("Helty %s: funzioni supportate %s", self.device.name, capabilities.as_dict())
+        self.device.capabilities = capabilities
+        if self._store is not None:
+            # Subito su disco: la entry ricaricata deve ritrovare la verifica
+            await self._store.async_save(self._stored_data())
+        return capabilities.entities != previous.entities
+
+    async def async_background_start(self) -> None:
+        """Primo avvio partendo dallo storage: verifica delle funzioni e polling.
+
+        Se la verifica cambia le entità da creare la config entry viene ricaricata.
+        """
+        if await self.async_probe_capabilities() and self.config_entry is not None:
+            self.hass.config_entries.async_schedule_reload(self.config_entry.entry_id)
+            return
+        await self.async_refresh()
+
+    @callback
+    def _async_check_capabilities(self, data: HeltyCMVSnapshot) -> None:
+        """Se il formato delle risposte cambia (nuovo firmware) ripete la verifica."""
+        read = self.device.read_fields
+        if self.device.capabilities.matches(
+            data.sensors_raw if "sensors_raw" in read else (),
+            data.config_raw if "config_raw" in read else (),
+        ):
+            self._mismatches = 0
+            return
+        self._mismatches += 1
+        if self._mismatches < CAPABILITY_MISMATCH_LIMIT:
+            _LOGGER.debug("Helty %s: risposta con un formato inatteso", self.device.name)
+            return
+        self._mismatches = 0
+        _LOGGER.info("Helty %s: formato delle risposte cambiato, nuova verifica delle funzioni", self.device.name)
+        # Le entità restano quelle attuali finché la nuova verifica non le cambia
+        self.device.capabilities = replace(self.device.capabilities, probed=False)
+        self._probed_at = None
+
+    @callback
+    def _async_maybe_probe(self, now: float) -> None:
+        """Ripete una verifica mai completata, al più ogni PROBE_RETRY_INTERVAL.
+
+        Se l'unità non supporta tutto la verifica viene ripetuta ogni
+        UNSUPPORTED_RECHECK_INTERVAL: un comando dato per non supportato
+        dopo un errore passeggero torna disponibile.
+        """
+        capabilities = self.device.capabilities
+        if capabilities.probed and capabilities.complete:
+            return
+        interval = UNSUPPORTED_RECHECK_INTERVAL if capabilities.probed else PROBE_RETRY_INTERVAL
+        if self._probing or (self._probed_at is not None and now - self._probed_at < interval):
+            return
+        self._probing = True
+        self.hass.async_create_task(self._async_reprobe())
+
+    async def _async_reprobe(self) -> None:
+        """Ripete la verifica e ricarica la entry solo se cambiano le entità."""
+        try:
+            changed = await self.async_probe_capabilities(recheck=True)
+        finally:
+            self._probing = False
+        if changed and self.config_entry is not None:
+            self.hass.config_entries.async_schedule_reload(self.config_entry.entry_id)
+
+    @callback
+    def _async_maybe_relocate(self, now: float) -> None:
+        """Avvia la ricerca dell'unità dopo troppi polling falliti di fila."""
+        if (
+            self.unit_name is None
+            or self.config_entry is None
+            or self._relocating
+            or self._scheduler.failures < RELOCATE_AFTER_FAILURES
+            or (self._relocated_at is not None and now - self._relocated_at < RELOCATE_INTERVAL)
+        ):
+            return
+        self._relocating = True
+        self._relocated_at = now
+        self.config_entry.async_create_background_task(
+            self.hass, self._async_relocate(), f"{DOMAIN} relocate {self.device.host}"
+        )
+
+    async def _async_relocate(self) -> None:
+        """Cerca sulla sottorete l'unità con lo stesso nome e ne aggiorna l'indirizzo.
+
+        L'aggiornamento della config entry la ricarica con il nuovo host;
+        gli id delle entità non cambiano.
+        """
+        try:
+            network = host_network(self.device.host)
+        except ValueError:
+            _LOGGER.debug("Helty %s: host non numerico, nessuna ricerca", self.device.host)
+            self._relocating = False
+            return
+        entry = self.config_entry
+        exclude = [
+            other.data[CONF_HOST] for other in self.hass.config_entries.async_entries(DOMAIN)
+        ]
+        try:
+            _LOGGER.info(
+                "Helty %s non risponde, cerco %s sulla sottorete %s",
+                self.device.host,
+                self.unit_name,
+                network,
             )
-            # Combina tutti i risultati in un unico dizionario
-            data = {
-                "op_status": op_status,
-                "indoor_temp": indoor_temp,
-                "outdoor_temp": outdoor_temp,
-                "indoor_humidity": indoor_humidity,
-                "leds_on": leds_on,
-            }
-            # Unisci anche i dati di op_status se presenti
-            if op_status:
-                data.update(op_status)
-
-            return data
+            units = await async_scan(
+                network, self.device.port, exclude, concurrency=RELOCATE_CONCURRENCY
+            )
+        finally:
+            self._relocating = False
+        matches = [unit for unit in units if unit.name == self.unit_name]
+        if len(matches) != 1:
+            if matches:
+                _LOGGER.warning(
+                    "Più unità Helty si chiamano %s (%s): indirizzo non aggiornato",
+                    self.unit_name,
+                    ", ".join(unit.host for unit in matches),
+                )
+            else:
+                _LOGGER.debug("Unità Helty %s non trovata su %s", self.unit_name, network)
+            return
+        host = matches[0].host
+        _LOGGER.warning(
+            "Unità Helty %s trovata su %s invece di %s, aggiorno la configurazione",
+            self.unit_name,
+            host,
+            self.device.host,
+        )
+        self.hass.config_entries.async_update_entry(entry, data={**entry.data, CONF_HOST: host})
+
+    @callback
+    def _async_schedule_save(self) -> None:
+        """Salva l'istantanea corrente con qualche secondo di ritardo."""
+        if self._store is not None:
+            self._read_at = time.time()
+            self._store.async_delay_save(self._stored_data, STORE_SAVE_DELAY)
+
+    @callback
+    def _stored_data(self) -> dict[str, Any]:
+        return {
+            "name": self.device.name,
+            "host": self.device.host,
+            "saved_at": self._read_at,
+            "snapshot": asdict(self.data) if self.data is not None else None,
+            "capabilities": (
+                self.device.capabilities.as_dict() if self.device.capabilities.probed else None
+            ),
+        }
+
+    @callback
+    def _async_run_boost(self, data: HeltyCMVSnapshot) -> None:
+        """Valuta il boost automatico su uno stato appena letto dal dispositivo."""
+        if self.boost is None or self._boost_writing:
+            return
+        mode = self.boost.evaluate(data, time.monotonic(), dt_util.now().time())
+        if mode is not None:
+            self._boost_writing = True
+            self.hass.async_create_task(self._async_write_boost_mode(mode))
+
+    async def _async_write_boost_mode(self, mode) -> None:
+        """Scrive solo il comando MODE_CMDS deciso dal controller."""
+        try:
+            _LOGGER.debug("Boost automatico di Helty %s: modalità %s", self.device.name, mode)
+            if not await self.async_set_mode(mode):
+                _LOGGER.warning("Boost automatico: impossibile impostare %s su Helty %s", mode, self.device.name)
+                # Non va riapplicata: il controller decide di nuovo alla prossima lettura
+                self.desired.clear(mode)
+        finally:
+            self._boost_writing = False
+
+    @callback
+    def _async_sample(self, data: HeltyCMVSnapshot, now: float) -> None:
+        """Aggiunge alle serie i campi appena letti dal dispositivo."""
+        for field in self.device.read_fields.intersection(self.trends):
+            value = getattr(data, field)
+            if value is not None:
+                self.trends[field].add(now, value)
+                self._sampled.add(field + TREND_SUFFIX)
+
+    @callback
+    def fields_available(self, fields: tuple[str, ...]) -> bool:
+        """True se i campi possono essere mostrati, anche se presi dalla cache."""
+        if not self.last_update_success:
+            return False
+        now = time.monotonic()
+        return all(self._cache.fresh(field, now) for field in fields)
+
+    @callback
+    def stale_attributes(self, fields: tuple[str, ...]) -> dict[str, Any] | None:
+        """Attributo age (secondi) dei valori serviti dalla cache, None se aggiornati."""
+        if not self._cache.stale:
+            return None
+        now = time.monotonic()
+        ages = [age for field in fields if (age := self._cache.age(field, now)) is not None]
+        return {"age": round(max(ages))} if ages else None
+
+    async def async_set_mode(self, mode, leds_on: bool | None = None) -> bool:
+        """Richiede velocità o preset, e con leds_on anche lo stato dei LED.
+
+        Vengono scritti solo i valori diversi dall'ultimo stato letto.
+        """
+        if mode not in MODE_CMDS:
+            _LOGGER.error("Modalità %s non supportata da Helty", mode)
+            return False
+        self.desired.request(mode, leds_on)
+        return await self._async_reconcile()
+
+    async def async_set_leds(self, leds_on: bool) -> bool:
+        """Richiede l'accensione o lo spegnimento dei LED."""
+        self.desired.request(leds_on=leds_on)
+        return await self._async_reconcile()
+
+    async def _async_reconcile(self, data: HeltyCMVSnapshot | None = None) -> bool:
+        """Scrive la differenza tra stato richiesto e ultimo stato letto.
+
+        data è lo stato appena letto, se il coordinator non l'ha ancora
+        salvato. Le scritture riuscite aggiornano subito lo stato in cache.
+        Se il dispositivo non risponde la richiesta resta in attesa e viene
+        riapplicata al primo polling riuscito; se la rifiuta viene
+        scartata. In entrambi i casi restituisce False.
+        """
+        target = (self.desired.mode, self.desired.leds_on)
+        mode, leds_on = self.desired.diff(data or self.data)
+        if mode is None and leds_on is None:
+            self.desired.clear(*target)
+            return True
+        self._reconciling = True
+        try:
+            result = await self.device.async_write(mode, leds_on)
+        except ConnectionError:
+            return False
+        finally:
+            self._reconciling = False
+        self.desired.clear(*target)
+        if not result:
+            _LOGGER.warning("Helty %s ha rifiutato la scrittura di %s", self.device.name, target)
+            return False
+        changes = dict(mode_state(mode)) if mode is not None else {}
+        if leds_on is not None:
+            changes["leds_on"] = leds_on
+        await self._async_apply_write(changes)
+        return True
+
+    async def async_start_proxy(self) -> None:
+        """Avvia il proxy locale; se la porta non è disponibile si prosegue senza."""
+        if self.proxy is None:
+            return
+        try:
+            await self.proxy.async_start()
+        except OSError as err:
+            _LOGGER.error("Impossibile avviare il proxy per Helty %s: %s", self.device.name, err)
+            self.proxy = None
+
+    @callback
+    def _async_external_write(self) -> None:
+        """Un client del proxy ha scritto sull'unità: si rilegge lo stato."""
+        self._scheduler.record_command(time.monotonic())
+        self.hass.async_create_task(self._verify_debouncer.async_call())
+
+    async def async_shutdown(self) -> None:
+        """Annulla le verifiche in sospeso e ferma il heartbeat e il proxy."""
+        await super().async_shutdown()
+        if self.proxy is not None:
+            await self.proxy.async_stop()
+        self._verify_debouncer.async_shutdown()
+        if self._unsub_heartbeat is not None:
+            self._unsub_heartbeat()
+            self._unsub_heartbeat = None
+        self.device.set_push_listener(None)
+
+    @callback
+    def async_start_push(self) -> None:
+        """In modalità push avvia il heartbeat VMGH? sulla connessione aperta.
+
+        Le risposte VMGI/VMGO che il dispositivo invia senza essere
+        interrogato aggiornano subito le entità, così come ogni cambio di
+        stato visto dal heartbeat, compresi quelli fatti dal pannello.
+        """
+        if not self._push or self._unsub_heartbeat is not None:
+            return
+        self.device.set_push_listener(self._async_handle_push)
+        self._unsub_heartbeat = async_track_time_interval(
+            self.hass, self._async_heartbeat, timedelta(seconds=self._heartbeat_interval)
+        )
+
+    async def _async_heartbeat(self, _now=None) -> None:
+        """Legge solo lo stato operativo e notifica se è cambiato."""
+        if self.data is None or not self.last_update_success:
+            # Il dispositivo non risponde: se ne occupa il polling con il suo backoff
+            return
+        now = time.monotonic()
+        try:
+            data = await self.device.async_get_snapshot(self.data, sensors=False)
+        except ConnectionError as err:
+            _LOGGER.debug("Heartbeat di Helty %s non riuscito: %s", self.device.name, err)
+            return
+        self._scheduler.record_poll(now, False, True)
+        self._cache.record(self.device.read_fields, now)
+        if data != self.data:
+            self._scheduler.boost_active = data.preset == PRESET_BOOST
+            self._async_set_data(data)
+            self._async_run_boost(data)
+
+    @callback
+    def _async_handle_push(self, values: dict[str, Any]) -> None:
+        """Applica i campi di una risposta arrivata senza richiesta."""
+        if self.data is None:
+            return
+        self._cache.record(values, time.monotonic())
+        data = replace(self.data, **values)
+        if data != self.data:
+            self._scheduler.boost_active = data.preset == PRESET_BOOST
+            self._async_set_data(data)
+            self._async_run_boost(data)
+
+    async def _async_apply_write(self, changes: dict) -> None:
+        """Applica l'effetto noto di una scrittura andata a buon fine.
+
+        Le entità vengono aggiornate senza attendere un polling completo; una
+        sola lettura VMGH? conferma poi lo stato dopo l'ultimo comando.
+        """
+        now = time.monotonic()
+        self._scheduler.record_command(now)
+        self._cache.record(changes, now)
+        if self.data is not None:
+            data = replace(self.data, **changes)
+            self._scheduler.boost_active = data.preset == PRESET_BOOST
+            self._async_reschedule(now)
+            # Notifica le entità e riprogramma il polling sulla cadenza veloce
+            self.async_set_updated_data(data)
+        await self._verify_debouncer.async_call()
+
+    async def _async_verify_state(self) -> None:
+        """Rilegge solo lo stato operativo (VMGH?)."""
+        if self.data is None:
+            return
+        now = time.monotonic()
+        try:
+            data = await self.device.async_get_snapshot(self.data, sensors=False)
         except ConnectionError as err:
-            raise UpdateFailed(f"Errore di comunicazione con Helty: {err}")
\ No newline at end of file
+            _LOGGER.debug("Verifica dello stato di Helty non riuscita: %s", err)
+            return
+        self._scheduler.record_poll(now, False, True)
+        self._scheduler.boost_active = data.preset == PRESET_BOOST
+        self._cache.record(self.device.read_fields, now)
+        self._async_set_data(data)
+        self._async_run_boost(data)
+
+    @callback
+    def _async_set_data(self, data: HeltyCMVSnapshot) -> None:
+        """Aggiorna i dati senza spostare il prossimo polling."""
+        self.data = data
+        self.async_update_listeners()
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Notifica solo le entità i cui campi sono cambiati.
+
+        Il contesto di ogni listener è la tupla dei campi dell'istantanea che
+        l'entità mostra. Un cambio di disponibilità notifica tutti, così come
+        ogni aggiornamento mentre si servono valori dalla cache.
+        """
+        changed = self._async_changed_fields()
+        for update_callback, context in list(self._listeners.values()):
+            if changed is None or context is None or not changed.isdisjoint(context):
+                update_callback()
+
+    @callback
+    def _async_changed_fields(self) -> set[str] | None:
+        """Campi cambiati dall'ultima notifica, None se vanno notificati tutti."""
+        data = self.data
+        stale = self._cache.stale
+        if (
+            data is None
+            or self.last_update_success != self._notified_available
+            or stale
+            or self._notified_stale
+        ):
+            self._notified_available = self.last_update_success
+            self._notified_stale = stale
+            self._sampled.clear()
+            self._notified = {
+                field: getattr(data, field) for field in SNAPSHOT_FIELDS
+            } if data is not None else {}
+            return None
+        changed = set()
+        for field in SNAPSHOT_FIELDS:
+            value = getattr(data, field)
+            last = self._notified.get(field, _UNSET)
+            if value == last:
+                continue
+            deadband = self._deadbands.get(field)
+            if (
+                deadband
+                and value is not None
+                and last is not None
+                and last is not _UNSET
+                and abs(value - last) <= deadband
+            ):
+                continue
+            self._notified[field] = value
+            changed.add(field)
+        changed |= self._sampled
+        self._sampled.clear()
+        return changed
+
+    @callback
+    def set_poll_phase(self, origin: float, fraction: float) -> None:
+        """Sfasa i polling di una frazione dell'intervallo rispetto a origin."""
+        self._scheduler.set_phase(origin, fraction * self._scheduler.status_interval)
+
+    @callback
+    def _async_reschedule(self, now: float) -> None:
+        """Imposta l'attesa prima del prossimo polling.
+
+        Mentre si servono valori dalla cache si riprova al più tardi quando il
+        prossimo di essi scade.
+        """
+        delay = self._scheduler.next_delay(now)
+        if self._cache.stale and (expiry := self._cache.next_expiry(now)) is not None:
+            delay = min(delay, max(expiry, 1))
+        self.update_interval = timedelta(seconds=delay)
@@ -0,0 +1,40 @@
+"""Diagnostics support for Helty CMV."""
+from __future__ import annotations
+
+from dataclasses import asdict
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_HOST
+from homeassistant.core import HomeAssistant
+
+from .const import CONF_CMV_ID, CONF_UNIT_NAME, DATA_HUB, DOMAIN
+from .coordinator import HeltyDataUpdateCoordinator
+from .hub import HeltyHub
+
+TO_REDACT = {CONF_HOST, CONF_CMV_ID, CONF_UNIT_NAME}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return connection state and per-command statistics for a config entry."""
+    coordinator: HeltyDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    hub: HeltyHub = hass.data[DATA_HUB]
+    data = coordinator.data
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "device": coordinator.device.diagnostics(),
+        "last_update_success": coordinator.last_update_success,
+        "snapshot": asdict(data) if data is not None else None,
+        "trends": {field: series.as_dict() for field, series in coordinator.trends.items()},
+        "desired_state": coordinator.desired.as_dict(),
+        "capabilities": coordinator.device.capabilities.as_dict(),
+        "proxy": coordinator.proxy.as_dict() if coordinator.proxy is not None else None,
+        "auto_boost": coordinator.boost.as_dict() if coordinator.boost is not None else None,
+        "hub": hub.stats(),
+    }
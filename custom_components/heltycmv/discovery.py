@@ -0,0 +1,110 @@
+"""Ricerca in parallelo delle unità Helty presenti su una sottorete."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Iterable
+from dataclasses import dataclass
+import ipaddress
+import logging
+
+from .const import CMV_NAME_PREFIX, NAME_CMD
+from .protocol import NAME_HEADER, HeltyFrameBuffer
+
+_LOGGER = logging.getLogger(__name__)
+
+# Host interrogati contemporaneamente e tempo concesso a ciascuno
+SCAN_CONCURRENCY = 64
+CONNECT_TIMEOUT = 1.0
+REPLY_TIMEOUT = 1.5
+READ_SIZE = 256
+# Una /22 al massimo: oltre la scansione diventa una cosa diversa
+MAX_SCAN_HOSTS = 1024
+
+
+@dataclass(frozen=True, slots=True)
+class HeltyDiscoveredUnit:
+    """Unità che ha risposto a VMNM? durante la scansione."""
+
+    host: str
+    port: int
+    name: str
+
+
+def scan_hosts(network: str, exclude: Iterable[str] = ()) -> list[str]:
+    """Indirizzi da interrogare in una sottorete, come '192.168.1.0/24'.
+
+    Solleva ValueError se la sottorete non è valida o è troppo grande.
+    """
+    net = ipaddress.ip_network(network.strip(), strict=False)
+    if net.num_addresses > MAX_SCAN_HOSTS + 2:
+        raise ValueError(f"Sottorete {net} troppo grande per la scansione")
+    excluded = set(exclude)
+    hosts = [str(host) for host in net.hosts()] if net.num_addresses > 1 else [str(net.network_address)]
+    return [host for host in hosts if host not in excluded]
+
+
+async def async_probe(
+    host: str,
+    port: int,
+    connect_timeout: float = CONNECT_TIMEOUT,
+    reply_timeout: float = REPLY_TIMEOUT,
+) -> str | None:
+    """Nome dell'unità se all'indirizzo risponde un modulo Helty, altrimenti None."""
+    try:
+        async with asyncio.timeout(connect_timeout):
+            reader, writer = await asyncio.open_connection(host, port)
+    except (TimeoutError, OSError):
+        return None
+    frames = HeltyFrameBuffer()
+    try:
+        async with asyncio.timeout(reply_timeout):
+            writer.write(NAME_CMD)
+            await writer.drain()
+            while True:
+                chunk = await reader.read(READ_SIZE)
+                if not chunk:
+                    frame = frames.flush()
+                    break
+                frames.feed(chunk)
+                frame = frames.pop_frame()
+                if frame is not None:
+                    break
+    except (TimeoutError, OSError):
+        return None
+    finally:
+        writer.close()
+    if frame is None or not frame.startswith(NAME_HEADER):
+        # Qualcosa risponde sulla porta, ma non è un'unità Helty
+        return None
+    name = frame.decode('ASCII', 'replace').removeprefix(CMV_NAME_PREFIX).strip()
+    return name or host
+
+
+def host_network(host: str, prefix: int = 24) -> str:
+    """Sottorete /prefix che contiene l'indirizzo; ValueError se host non è un IP."""
+    return str(ipaddress.ip_network(f"{ipaddress.ip_address(host)}/{prefix}", strict=False))
+
+
+async def async_scan(
+    network: str,
+    port: int,
+    exclude: Iterable[str] = (),
+    concurrency: int = SCAN_CONCURRENCY,
+) -> list[HeltyDiscoveredUnit]:
+    """Interroga in parallelo tutti gli host della sottorete.
+
+    Al massimo concurrency connessioni sono aperte nello stesso momento.
+    Restituisce le unità trovate in ordine di indirizzo.
+    """
+    hosts = scan_hosts(network, exclude)
+    limiter = asyncio.Semaphore(concurrency)
+
+    async def probe(host: str) -> HeltyDiscoveredUnit | None:
+        async with limiter:
+            name = await async_probe(host, port)
+        return HeltyDiscoveredUnit(host, port, name) if name is not None else None
+
+    results = await asyncio.gather(*(probe(host) for host in hosts))
+    units = [unit for unit in results if unit is not None]
+    _LOGGER.debug("Scansione di %s: %s unità Helty su %s host", network, len(units), len(hosts))
+    return units
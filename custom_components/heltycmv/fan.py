@@ -16,15 +16,28 @@ from .const import (
     DOMAIN
 )
 from homeassistant.components.fan import FanEntity, FanEntityFeature
+from homeassistant.util.percentage import percentage_to_ordered_list_item
 from .coordinator import HeltyDataUpdateCoordinator # Importa il nuovo coordinator
 
 _LOGGER = logging.getLogger(__name__)
 
+# Velocità in ordine crescente: le percentuali intermedie vanno al gradino più vicino
+ORDERED_SPEEDS = [FAN_LOW, FAN_MEDIUM, FAN_HIGH, FAN_HIGHEST]
+
+
+def _speed_mode(percentage: int) -> int:
+    """Chiave di MODE_CMDS per una percentuale qualsiasi."""
+    if percentage <= 0:
+        return FAN_OFF
+    return percentage_to_ordered_list_item(ORDERED_SPEEDS, percentage)
+
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
     # Ottieni il coordinator creato in __init__.py invece dell'oggetto cmv
     coordinator = hass.data[DOMAIN][config_entry.entry_id]
-    async_add_entities([HeltyCMVFan(coordinator)], True)
+    # Senza VMGH? lo stato della ventola non può essere letto
+    if coordinator.device.capabilities.config:
+        async_add_entities([HeltyCMVFan(coordinator)])
 
 
 # Eredita da CoordinatorEntity invece che solo da FanEntity
@@ -41,7 +54,7 @@ class HeltyCMVFan(CoordinatorEntity, FanEntity):
 
     def __init__(self, coordinator: HeltyDataUpdateCoordinator):
         # Il costruttore ora riceve il coordinator
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=("fan_mode", "preset"))
         self._cmv = coordinator.device # Accediamo al dispositivo tramite il coordinator
         self._attr_unique_id = f"{self._cmv.cmv_id}_cmv_control"
         self._attr_name = f"{self._cmv.name} CMV Control"
@@ -55,9 +68,18 @@ class HeltyCMVFan(CoordinatorEntity, FanEntity):
             model="Flow",
         )
 
-    # La proprietà 'available' è ora GESTITA IN AUTOMATICO da CoordinatorEntity!
-    # Non è più necessario definirla. Sarà True se l'ultimo aggiornamento
-    # del coordinator è andato a buon fine.
+    @property
+    def available(self) -> bool:
+        """Disponibile finché i valori in cache non superano l'età massima."""
+        return self.coordinator.fields_available(self.coordinator_context)
+
+    @property
+    def extra_state_attributes(self):
+        """Età dei valori in cache e stato del boost automatico, se abilitato."""
+        attributes = dict(self.coordinator.stale_attributes(self.coordinator_context) or {})
+        if self.coordinator.boost is not None:
+            attributes["auto_boost"] = self.coordinator.boost.active
+        return attributes or None
 
     @property
     def is_on(self) -> bool | None:
@@ -68,40 +90,41 @@ class HeltyCMVFan(CoordinatorEntity, FanEntity):
     def percentage(self) -> int | None:
         """Ottiene la velocità dai dati del coordinator."""
         if self.coordinator.data:
-            return self.coordinator.data.get("fan_mode")
+            return self.coordinator.data.fan_mode
         return None
 
     @property
     def preset_mode(self) -> str | None:
         """Ottiene il preset dai dati del coordinator."""
         if self.coordinator.data:
-            return self.coordinator.data.get("preset")
+            return self.coordinator.data.preset
         return None
 
-    # I metodi `async_set` rimangono simili, ma chiamano direttamente il dispositivo
-    # e poi forzano un refresh del coordinator per aggiornare subito lo stato.
+    # I comandi passano dal coordinator, che aggiorna subito lo stato in cache
+    # e verifica il risultato con una sola lettura VMGH?.
     async def async_set_percentage(self, percentage: int) -> None:
-        if await self._cmv.set_cmv_mode(percentage):
-            await self.coordinator.async_request_refresh()
-        else:
+        if not await self.coordinator.async_set_mode(_speed_mode(percentage)):
             _LOGGER.error("Impossibile impostare la percentuale a %s", percentage)
 
     async def async_set_preset_mode(self, preset_mode: str) -> None:
-        if await self._cmv.set_cmv_mode(preset_mode):
-            await self.coordinator.async_request_refresh()
-        else:
+        if not await self.coordinator.async_set_mode(preset_mode):
             _LOGGER.error("Impossibile impostare il preset a %s", preset_mode)
 
     async def async_turn_off(self, **kwargs: Any) -> None:
-        if await self._cmv.set_cmv_mode(FAN_OFF):
-            await self.coordinator.async_request_refresh()
-        else:
+        if not await self.coordinator.async_set_mode(FAN_OFF):
             _LOGGER.error("Impossibile spegnere la ventola")
 
     async def async_turn_on(self, percentage=None, preset_mode=None, **kwargs: Any) -> None:
-        if await self._cmv.set_cmv_mode(FAN_LOW):
-            await self.coordinator.async_request_refresh()
+        if preset_mode is not None:
+            mode = preset_mode
+        elif percentage is not None:
+            mode = _speed_mode(percentage)
+        elif self.is_on:
+            # Già in funzione: nessun comando da inviare
+            return
         else:
+            mode = FAN_LOW
+        if not await self.coordinator.async_set_mode(mode):
             _LOGGER.error("Impossibile accendere la ventola")
 
     # RIMUOVERE il metodo async_update()!
@@ -0,0 +1,124 @@
+"""Hub condiviso tra tutte le unità Helty configurate."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any
+
+from .cmv import HeltyCMV
+from .const import DEFAULT_HUB_CONCURRENCY
+
+if TYPE_CHECKING:
+    from .coordinator import HeltyDataUpdateCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+# Tempo concesso a ogni unità in un comando di gruppo
+FLEET_UNIT_TIMEOUT = 10.0
+
+
+class HeltyHub:
+    """Possiede i dispositivi e distribuisce il loro polling nel tempo.
+
+    Un solo hub per istanza di Home Assistant. Limita quanti dispositivi
+    vengono interrogati contemporaneamente e sfasa i polling delle unità
+    sull'intervallo, così decine di unità non interrogano l'access point
+    nello stesso istante.
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_HUB_CONCURRENCY) -> None:
+        self.max_concurrency = max_concurrency
+        self._limiter = asyncio.Semaphore(max_concurrency)
+        self._origin = time.monotonic()
+        self._devices: dict[str, HeltyCMV] = {}
+        self._coordinators: dict[str, HeltyDataUpdateCoordinator] = {}
+
+    @property
+    def empty(self) -> bool:
+        """True se non ci sono più unità registrate."""
+        return not self._devices
+
+    def create_device(
+        self, entry_id: str, host: str, port: int, cmv_id: str | None = None
+    ) -> HeltyCMV:
+        """Crea il dispositivo di una config entry, soggetto al limite condiviso."""
+        device = HeltyCMV(host, port, limiter=self._limiter, cmv_id=cmv_id)
+        self._devices[entry_id] = device
+        return device
+
+    def register(self, entry_id: str, coordinator: HeltyDataUpdateCoordinator) -> None:
+        """Aggiunge il coordinator di una unità e ridistribuisce gli slot."""
+        self._coordinators[entry_id] = coordinator
+        self._spread_slots()
+
+    async def async_remove(self, entry_id: str) -> None:
+        """Rimuove una unità e ne chiude la connessione."""
+        self._coordinators.pop(entry_id, None)
+        device = self._devices.pop(entry_id, None)
+        if device is not None:
+            await device.async_close()
+        self._spread_slots()
+
+    async def async_apply_fleet(
+        self,
+        entry_ids: list[str] | None,
+        mode=None,
+        leds_on: bool | None = None,
+        timeout: float = FLEET_UNIT_TIMEOUT,
+    ) -> dict[str, dict[str, Any]]:
+        """Imposta modalità e/o LED su più unità contemporaneamente.
+
+        Le scritture partono tutte insieme e il limite condiviso dell'hub
+        stabilisce quante sono in volo nello stesso momento; ogni unità ha
+        il suo timeout. Le letture di verifica restano ai debouncer dei
+        coordinator e partono quindi insieme dopo l'ultima scrittura.
+        Restituisce l'esito per config entry.
+        """
+        targets = {
+            entry_id: coordinator
+            for entry_id, coordinator in self._coordinators.items()
+            if entry_ids is None or entry_id in entry_ids
+        }
+
+        async def apply(coordinator: HeltyDataUpdateCoordinator) -> dict[str, Any]:
+            result: dict[str, Any] = {"name": coordinator.device.name, "success": False}
+            try:
+                async with asyncio.timeout(timeout):
+                    if mode is not None:
+                        result["success"] = await coordinator.async_set_mode(mode, leds_on)
+                    else:
+                        result["success"] = await coordinator.async_set_leds(leds_on)
+            except TimeoutError:
+                result["error"] = "timeout"
+            if not result["success"] and "error" not in result:
+                result["error"] = "unreachable" if not coordinator.device.online else "rejected"
+            return result
+
+        results = await asyncio.gather(*(apply(coordinator) for coordinator in targets.values()))
+        summary = dict(zip(targets, results))
+        _LOGGER.debug(
+            "Comando di gruppo su %s unità Helty, %s riuscite",
+            len(summary),
+            sum(1 for result in results if result["success"]),
+        )
+        return summary
+
+    def stats(self) -> dict[str, Any]:
+        """Statistiche aggregate su tutte le unità."""
+        devices = self._devices.values()
+        return {
+            "units": len(self._devices),
+            "online": sum(1 for device in devices if device.online),
+            "connected": sum(1 for device in devices if device.connected),
+            "pending_commands": sum(device.pending_commands for device in devices),
+            "active_requests": sum(1 for device in devices if device.busy),
+            "max_concurrency": self.max_concurrency,
+        }
+
+    def _spread_slots(self) -> None:
+        """Assegna a ogni unità uno sfasamento uniforme sull'intervallo."""
+        count = len(self._coordinators)
+        for index, entry_id in enumerate(sorted(self._coordinators)):
+            self._coordinators[entry_id].set_poll_phase(self._origin, index / count)
+        _LOGGER.debug("Slot di polling distribuiti su %s unità Helty", count)
@@ -0,0 +1,214 @@
+"""Decodifica delle risposte VMGI/VMGO in istantanee dello stato."""
+from __future__ import annotations
+
+from collections.abc import Mapping
+from dataclasses import dataclass, replace
+from types import MappingProxyType
+from typing import Any
+
+from .const import LED_OFF_CMD, LED_ON_CMD, MODE_CMDS
+from .protocol import CONFIG_HEADER, SENSORS_HEADER
+from .stats import HeltyDeviceStats
+
+# VMWH + due cifre di registro + valore: il valore scritto da un comando è lo
+# stesso codice che il dispositivo riporta in VMGO.
+_REGISTER_VALUE_START = 6
+
+
+def _register_value(cmd: bytes) -> int:
+    return int(cmd[_REGISTER_VALUE_START:])
+
+
+def _mode_fields(mode) -> Mapping[str, Any]:
+    if isinstance(mode, str):
+        return MappingProxyType({"preset": mode, "fan_mode": None})
+    return MappingProxyType({"preset": None, "fan_mode": mode})
+
+
+# Tabelle derivate da MODE_CMDS e dai comandi LED, usate sia per decodificare
+# le risposte sia per prevedere l'effetto di una scrittura.
+MODE_FIELDS: Mapping[Any, Mapping[str, Any]] = MappingProxyType(
+    {mode: _mode_fields(mode) for mode in MODE_CMDS}
+)
+OP_STATES: Mapping[int, Mapping[str, Any]] = MappingProxyType(
+    {_register_value(cmd): MODE_FIELDS[mode] for mode, cmd in MODE_CMDS.items()}
+)
+LED_STATES: Mapping[int, bool] = MappingProxyType(
+    {_register_value(LED_ON_CMD): True, _register_value(LED_OFF_CMD): False}
+)
+UNKNOWN_OP_STATE: Mapping[str, Any] = MappingProxyType({"preset": None, "fan_mode": None})
+
+
+@dataclass(frozen=True, slots=True)
+class HeltyField:
+    """Campo numerico con nome: posizione dopo l'intestazione e divisore."""
+
+    key: str
+    index: int
+    scale: int = 1
+
+
+# Campi VMGI di cui è noto il significato. Il protocollo è ricavato
+# dall'app e le altre posizioni cambiano con modello e firmware: restano
+# disponibili grezze in sensors_raw finché non se ne conosce il significato,
+# poi basta aggiungerle qui.
+SENSOR_FIELDS = (
+    HeltyField("indoor_temp", 1, 10),
+    HeltyField("outdoor_temp", 2, 10),
+    HeltyField("indoor_humidity", 3, 10),
+)
+# Posizioni VMGO decodificate: stato operativo e LED
+OP_STATE_INDEX = 1
+LED_INDEX = 2
+# Nome del campo con tutti i valori grezzi di ciascuna risposta
+RAW_FIELDS = {SENSORS_HEADER: "sensors_raw", CONFIG_HEADER: "config_raw"}
+KNOWN_INDEXES = {
+    SENSORS_HEADER: frozenset(field.index for field in SENSOR_FIELDS),
+    CONFIG_HEADER: frozenset((OP_STATE_INDEX, LED_INDEX)),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class HeltyCMVSnapshot:
+    """Stato completo del dispositivo letto con un solo VMGI? e un solo VMGH?."""
+
+    indoor_temp: float | None = None
+    outdoor_temp: float | None = None
+    indoor_humidity: float | None = None
+    fan_mode: int | None = None
+    preset: str | None = None
+    leds_on: bool | None = None
+    # Tutti i campi numerici delle risposte, per posizione a partire da 1
+    sensors_raw: tuple[int | None, ...] = ()
+    config_raw: tuple[int | None, ...] = ()
+
+
+def mode_state(mode) -> Mapping[str, Any]:
+    """Campi dell'istantanea che un comando MODE_CMDS riuscito imposta."""
+    return MODE_FIELDS.get(mode) or _mode_fields(mode)
+
+
+def current_mode(snapshot: HeltyCMVSnapshot):
+    """Chiave di MODE_CMDS corrispondente allo stato letto, se noto."""
+    return snapshot.preset if snapshot.preset is not None else snapshot.fan_mode
+
+
+def _raw_values(data: list[bytes]) -> tuple[int | None, ...]:
+    values = []
+    for item in data[1:]:
+        try:
+            values.append(int(item))
+        except ValueError:
+            values.append(None)
+    return tuple(values)
+
+
+def parse_sensors(raw: bytes) -> Mapping[str, Any]:
+    """Estrae da una risposta VMGI i campi di SENSOR_FIELDS e quelli grezzi."""
+    data = raw.split(b',')
+    if data[0] != SENSORS_HEADER:
+        return MappingProxyType({})
+    values: dict[str, Any] = {"sensors_raw": _raw_values(data)}
+    for field in SENSOR_FIELDS:
+        try:
+            values[field.key] = int(data[field.index]) / field.scale
+        except (IndexError, ValueError):
+            values[field.key] = None
+    return MappingProxyType(values)
+
+
+def parse_config(raw: bytes) -> Mapping[str, Any]:
+    """Estrae stato operativo, LED e campi grezzi da una risposta VMGO."""
+    data = raw.split(b',')
+    if data[0] != CONFIG_HEADER:
+        return MappingProxyType({})
+    try:
+        values = dict(OP_STATES.get(int(data[OP_STATE_INDEX]), UNKNOWN_OP_STATE))
+    except (IndexError, ValueError):
+        values = dict(UNKNOWN_OP_STATE)
+    try:
+        values["leds_on"] = LED_STATES.get(int(data[LED_INDEX]))
+    except (IndexError, ValueError):
+        values["leds_on"] = None
+    values["config_raw"] = _raw_values(data)
+    return MappingProxyType(values)
+
+
+PARSERS = {SENSORS_HEADER: parse_sensors, CONFIG_HEADER: parse_config}
+
+
+def valid_values(parsed: Mapping[str, Any]) -> dict[str, Any]:
+    """Solo i campi letti correttamente; preset e velocità vanno in coppia."""
+    values = {
+        key: value for key, value in parsed.items()
+        if value is not None or key in UNKNOWN_OP_STATE
+    }
+    if "preset" in values and values["preset"] is None and values["fan_mode"] is None:
+        del values["preset"], values["fan_mode"]
+    return values
+
+
+def _incomplete(parsed: Mapping[str, Any]) -> bool:
+    """True se la risposta aveva campi mancanti, non numerici o sconosciuti."""
+    return not parsed or len(valid_values(parsed)) < len(parsed)
+
+
+class HeltyResponseParser:
+    """Decodifica le risposte di un dispositivo ricordando l'ultima di ogni tipo.
+
+    Se una risposta è identica byte per byte alla precedente dello stesso
+    tipo viene restituito il risultato già calcolato, e se nulla è cambiato
+    rispetto all'ultima istantanea costruita si riusa quella.
+    """
+
+    __slots__ = ("_last_raw", "_last_snapshot", "_stats", "last_fields")
+
+    def __init__(self, stats: HeltyDeviceStats | None = None) -> None:
+        self._last_raw: dict[bytes, tuple[bytes, Mapping[str, Any]]] = {}
+        self._last_snapshot: HeltyCMVSnapshot | None = None
+        self._stats = stats
+        # Campi con un valore valido nelle risposte dell'ultima istantanea
+        self.last_fields: frozenset[str] = frozenset()
+
+    def parse(self, raw: bytes) -> Mapping[str, Any]:
+        """Decodifica una risposta VMGI o VMGO."""
+        return self._parse(raw)[0]
+
+    def snapshot(
+        self, base: HeltyCMVSnapshot | None, replies: list[bytes]
+    ) -> HeltyCMVSnapshot:
+        """Applica le risposte a base e restituisce la nuova istantanea.
+
+        I campi mancanti o illeggibili in una risposta mantengono il valore
+        di base invece di essere azzerati.
+        """
+        values: dict[str, Any] = {}
+        unchanged = base is not None and base is self._last_snapshot
+        for raw in replies:
+            parsed, cached = self._parse(raw)
+            unchanged = unchanged and cached
+            values.update(valid_values(parsed))
+        self.last_fields = frozenset(values)
+        if unchanged:
+            return base
+        self._last_snapshot = replace(base or HeltyCMVSnapshot(), **values)
+        return self._last_snapshot
+
+    def _parse(self, raw: bytes) -> tuple[Mapping[str, Any], bool]:
+        header = raw[:4]
+        last = self._last_raw.get(header)
+        if last is not None and last[0] == raw:
+            return last[1], True
+        parse = PARSERS.get(header)
+        if parse is None:
+            self._count_failure()
+            return MappingProxyType({}), False
+        parsed = parse(raw)
+        if _incomplete(parsed):
+            self._count_failure()
+        self._last_raw[header] = (raw, parsed)
+        return parsed, False
+
+    def _count_failure(self) -> None:
+        if self._stats is not None:
+            self._stats.parse_failures += 1
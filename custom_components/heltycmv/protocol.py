@@ -0,0 +1,129 @@
+"""Framing delle risposte del protocollo VMxx."""
+from __future__ import annotations
+
+from .const import CONFIG_GET_CMD, NAME_CMD, SENSORS_CMD
+
+OK_REPLY = b'OK'
+NAME_HEADER = b'VMNM'
+SENSORS_HEADER = b'VMGI'
+CONFIG_HEADER = b'VMGO'
+WRITE_PREFIX = b'VMWH'
+
+TERMINATOR_BYTES = b'\r\n\x00'
+NUMERIC_BYTES = frozenset(b'0123456789,-. ')
+# Le risposte VMGI/VMGO contengono solo numeri separati da virgole: il frame
+# finisce al primo byte diverso. Prima di accettarne una senza terminatore
+# servono almeno i campi letti dal parser.
+NUMERIC_MIN_FIELDS = {SENSORS_HEADER: 4, CONFIG_HEADER: 3}
+HEADERS = (SENSORS_HEADER + b',', CONFIG_HEADER + b',', NAME_HEADER)
+
+EXPECTED_HEADERS = {
+    NAME_CMD: NAME_HEADER,
+    SENSORS_CMD: SENSORS_HEADER,
+    CONFIG_GET_CMD: CONFIG_HEADER,
+}
+
+
+def expected_header(cmd: bytes) -> bytes | None:
+    """Intestazione della risposta attesa per un comando, se nota."""
+    if cmd.startswith(WRITE_PREFIX):
+        return OK_REPLY
+    return EXPECTED_HEADERS.get(cmd)
+
+
+def is_known_header(frame: bytes) -> bool:
+    """True se il frame è una risposta riconosciuta del protocollo."""
+    return frame == OK_REPLY or frame.startswith((SENSORS_HEADER, CONFIG_HEADER, NAME_HEADER))
+
+
+class HeltyFrameBuffer:
+    """Accumula i byte letti dal socket e ne estrae le risposte complete.
+
+    Un frame è completo quando arriva un terminatore, quando inizia la
+    risposta successiva (risposte in pipeline senza separatore) oppure, per
+    OK e per VMGI/VMGO, quando la lunghezza o il contenuto lo rendono certo.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def feed(self, data: bytes) -> None:
+        """Aggiunge i byte ricevuti."""
+        self._buffer += data
+
+    def clear(self) -> None:
+        """Scarta i byte non ancora consumati."""
+        self._buffer.clear()
+
+    def pop_frame(self) -> bytes | None:
+        """Restituisce il prossimo frame completo, o None se manca ancora qualcosa."""
+        self._skip_terminators()
+        buffer = self._buffer
+        if not buffer:
+            return None
+        if buffer.startswith(OK_REPLY):
+            return self._take(len(OK_REPLY))
+        for header in NUMERIC_MIN_FIELDS:
+            if buffer.startswith(header):
+                end = self._numeric_end()
+                return self._take(end) if end is not None else None
+        end = self._delimited_end()
+        return self._take(end) if end is not None else None
+
+    def flush(self) -> bytes | None:
+        """Restituisce il frame senza terminatore rimasto nel buffer, se plausibile.
+
+        Usato solo quando il dispositivo chiude la connessione. L'ultimo campo
+        di un VMGI/VMGO può essere stato troncato a metà numero e viene
+        scartato; se poi restano meno campi del necessario il frame non viene
+        restituito. Il buffer viene comunque svuotato.
+        """
+        self._skip_terminators()
+        if not self._buffer:
+            return None
+        frame = bytes(self._buffer).strip()
+        self._buffer.clear()
+        for header, min_fields in NUMERIC_MIN_FIELDS.items():
+            if frame.startswith(header):
+                frame = frame[:frame.rfind(b',')]
+                if frame.count(b',') + 1 < min_fields:
+                    return None
+        return frame
+
+    def _skip_terminators(self) -> None:
+        index = 0
+        while index < len(self._buffer) and self._buffer[index] in TERMINATOR_BYTES:
+            index += 1
+        if index:
+            del self._buffer[:index]
+
+    def _take(self, end: int) -> bytes:
+        frame = bytes(self._buffer[:end])
+        del self._buffer[:end]
+        return frame.strip()
+
+    def _numeric_end(self) -> int | None:
+        buffer = self._buffer
+        index = len(SENSORS_HEADER)
+        while index < len(buffer):
+            if buffer[index] not in NUMERIC_BYTES:
+                return index
+            index += 1
+        return None
+
+    def _delimited_end(self) -> int | None:
+        buffer = self._buffer
+        ends = [
+            index
+            for index in (buffer.find(byte, 1) for byte in (b'\r', b'\n', b'\x00'))
+            if index != -1
+        ]
+        ends.extend(
+            index
+            for index in (buffer.find(header, 1) for header in HEADERS)
+            if index != -1
+        )
+        return min(ends) if ends else None
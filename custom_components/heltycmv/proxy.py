@@ -0,0 +1,120 @@
+"""Proxy TCP locale che condivide la connessione verso un'unità Helty."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+import logging
+import re
+
+from .cmv import HeltyCMV
+from .const import DEFAULT_PROXY_HOST, DEFAULT_PROXY_TTL
+from .protocol import OK_REPLY, WRITE_PREFIX
+
+_LOGGER = logging.getLogger(__name__)
+
+# Letture (VMGI?, VMGH?, VMNM?...) e scritture VMWH con registro e valore
+COMMAND_RE = re.compile(rb"VM[A-Z]{2}\?|VMWH\d{7}")
+REPLY_TERMINATOR = b"\r\n"
+READ_SIZE = 1024
+# Oltre questa lunghezza senza un comando valido il client viene chiuso
+MAX_PENDING_BYTES = 256
+MAX_CLIENTS = 16
+# Client che non inviano nulla per questo tempo vengono chiusi
+CLIENT_IDLE_TIMEOUT = 300
+
+
+class HeltyProxyServer:
+    """Risponde ai client VMxx al posto dell'unità.
+
+    Le letture vengono servite dall'ultima risposta del dispositivo se più
+    recente di ttl secondi, altrimenti accodate insieme ai comandi
+    dell'integrazione, che accorpa letture identiche. Le scritture passano
+    sempre dalla coda e on_write viene chiamato dopo ognuna riuscita, così
+    lo stato mostrato in Home Assistant viene riletto. Se il dispositivo non
+    risponde la connessione del client viene chiusa, come farebbe il modulo.
+    Non c'è autenticazione: per default si accettano solo client locali.
+    """
+
+    def __init__(
+        self,
+        device: HeltyCMV,
+        port: int,
+        ttl: float = DEFAULT_PROXY_TTL,
+        host: str = DEFAULT_PROXY_HOST,
+        on_write: Callable[[], None] | None = None,
+    ) -> None:
+        self._device = device
+        self._host = host
+        self.port = port
+        self.ttl = ttl
+        self._on_write = on_write
+        self._server: asyncio.Server | None = None
+        self._clients: set[asyncio.StreamWriter] = set()
+        self.requests = 0
+        self.cache_hits = 0
+        self.rejected = 0
+
+    async def async_start(self) -> None:
+        """Apre la porta in ascolto; solleva OSError se è già occupata."""
+        self._server = await asyncio.start_server(self._handle_client, self._host, self.port)
+        _LOGGER.info("Proxy per Helty %s in ascolto sulla porta %s", self._device.name, self.port)
+
+    async def async_stop(self) -> None:
+        """Chiude la porta e i client collegati."""
+        if self._server is None:
+            return
+        self._server.close()
+        for writer in list(self._clients):
+            writer.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if len(self._clients) >= MAX_CLIENTS:
+            self.rejected += 1
+            writer.close()
+            return
+        self._clients.add(writer)
+        buffer = b""
+        try:
+            while True:
+                async with asyncio.timeout(CLIENT_IDLE_TIMEOUT):
+                    data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+                buffer += data
+                cmds = COMMAND_RE.findall(buffer)
+                if not cmds:
+                    if len(buffer) > MAX_PENDING_BYTES:
+                        break
+                    continue
+                # Come il modulo, i byte dopo l'ultimo comando riconosciuto restano in attesa
+                buffer = buffer[buffer.rfind(cmds[-1]) + len(cmds[-1]):]
+                replies = [await self._reply(cmd) for cmd in cmds]
+                writer.write(b"".join(reply + REPLY_TERMINATOR for reply in replies))
+                await writer.drain()
+        except (TimeoutError, ConnectionError) as err:
+            _LOGGER.debug("Proxy Helty %s: client chiuso (%r)", self._device.name, err)
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    async def _reply(self, cmd: bytes) -> bytes:
+        self.requests += 1
+        reply, cached = await self._device.async_proxy_command(cmd, self.ttl)
+        if cached:
+            self.cache_hits += 1
+        elif cmd.startswith(WRITE_PREFIX) and reply == OK_REPLY and self._on_write is not None:
+            self._on_write()
+        return reply
+
+    def as_dict(self) -> dict:
+        return {
+            "host": self._host,
+            "port": self.port,
+            "ttl": self.ttl,
+            "clients": len(self._clients),
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,94 @@
+"""Stato desiderato di un'unità Helty e differenza minima da scrivere."""
+from __future__ import annotations
+
+import logging
+import time
+
+from .parser import HeltyCMVSnapshot, current_mode
+
+_LOGGER = logging.getLogger(__name__)
+
+# Le richieste non scritte da più di così (secondi) non vengono più riapplicate
+REQUEST_MAX_AGE = 900
+
+
+class HeltyDesiredState:
+    """Modalità e LED richiesti e non ancora confermati dal dispositivo.
+
+    Ogni richiesta aggiorna l'obiettivo; diff lo confronta con l'ultima
+    istantanea e restituisce solo le scritture necessarie. L'obiettivo
+    viene dimenticato quando le scritture vanno a buon fine (o non servono),
+    altrimenti resta in attesa e viene riapplicato quando l'unità torna a
+    rispondere, ma non oltre REQUEST_MAX_AGE. Dopo la conferma i cambi
+    fatti dal pannello non vengono più contrastati.
+    """
+
+    def __init__(self) -> None:
+        self.mode = None
+        self.leds_on: bool | None = None
+        # Momento (monotono) dell'ultima richiesta di ciascuna parte
+        self._mode_at = 0.0
+        self._leds_at = 0.0
+
+    @property
+    def pending(self) -> bool:
+        """True se c'è un obiettivo non ancora scritto."""
+        return self.mode is not None or self.leds_on is not None
+
+    @property
+    def since(self) -> float | None:
+        """Momento della richiesta più vecchia ancora in attesa."""
+        times = [
+            at
+            for value, at in ((self.mode, self._mode_at), (self.leds_on, self._leds_at))
+            if value is not None
+        ]
+        return min(times) if times else None
+
+    def request(self, mode=None, leds_on: bool | None = None) -> None:
+        """Aggiorna l'obiettivo; i campi a None restano quelli già richiesti."""
+        now = time.monotonic()
+        if mode is not None:
+            self.mode = mode
+            self._mode_at = now
+        if leds_on is not None:
+            self.leds_on = leds_on
+            self._leds_at = now
+
+    def expire(self, now: float, max_age: float = REQUEST_MAX_AGE) -> bool:
+        """Dimentica le richieste in attesa da più di max_age secondi; True se ce n'erano."""
+        expired = False
+        if self.mode is not None and now - self._mode_at > max_age:
+            _LOGGER.debug("Richiesta della modalità %s scaduta", self.mode)
+            self.mode = None
+            expired = True
+        if self.leds_on is not None and now - self._leds_at > max_age:
+            _LOGGER.debug("Richiesta dei LED %s scaduta", self.leds_on)
+            self.leds_on = None
+            expired = True
+        return expired
+
+    def diff(self, snapshot: HeltyCMVSnapshot | None) -> tuple:
+        """(modalità, LED) da scrivere per raggiungere l'obiettivo, None se già a posto."""
+        mode, leds_on = self.mode, self.leds_on
+        if snapshot is not None:
+            if mode is not None and current_mode(snapshot) == mode:
+                mode = None
+            if leds_on is not None and snapshot.leds_on == leds_on:
+                leds_on = None
+        return mode, leds_on
+
+    def clear(self, mode=None, leds_on: bool | None = None) -> None:
+        """Dimentica le parti dell'obiettivo appena scritte, se non sono cambiate."""
+        if self.mode == mode:
+            self.mode = None
+        if self.leds_on == leds_on:
+            self.leds_on = None
+
+    def as_dict(self) -> dict:
+        since = self.since
+        return {
+            "mode": self.mode,
+            "leds_on": self.leds_on,
+            "pending_for": round(time.monotonic() - since) if since is not None else None,
+        }
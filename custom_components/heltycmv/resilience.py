@@ -0,0 +1,135 @@
+"""Politica di ripetizione e circuit breaker per le richieste a un'unità Helty."""
+from __future__ import annotations
+
+from collections.abc import Iterable
+import logging
+import random
+import time
+
+from .command_queue import WRITE_KEY_LENGTH
+from .const import LED_OFF_CMD, LED_ON_CMD, MODE_CMDS
+from .protocol import WRITE_PREFIX
+
+_LOGGER = logging.getLogger(__name__)
+
+# Tempo concesso a un singolo tentativo, molto meno dei 10 s di una richiesta
+ATTEMPT_TIMEOUT = 2.5
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.2
+RETRY_MAX_DELAY = 1.5
+
+# Tentativi falliti consecutivi dopo i quali il circuito si apre
+BREAKER_FAILURE_THRESHOLD = 4
+BREAKER_RESET_TIMEOUT = 15.0
+BREAKER_MAX_RESET_TIMEOUT = 300.0
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# Scritture che impostano un valore assoluto (modalità e LED): ripeterle
+# lascia il dispositivo nello stesso stato. Il reset dei filtri no.
+IDEMPOTENT_WRITES = frozenset(
+    cmd[:WRITE_KEY_LENGTH] for cmd in (*MODE_CMDS.values(), LED_ON_CMD, LED_OFF_CMD)
+)
+
+
+class CircuitOpenError(ConnectionError):
+    """Il dispositivo è considerato irraggiungibile e non viene interrogato."""
+
+
+def is_idempotent(cmd: bytes) -> bool:
+    """True se il comando può essere ripetuto anche dopo essere stato inviato."""
+    if not cmd.startswith(WRITE_PREFIX):
+        return True
+    return cmd[:WRITE_KEY_LENGTH] in IDEMPOTENT_WRITES
+
+
+def retry_safe(cmds: Iterable[bytes]) -> bool:
+    """True se l'intero gruppo di comandi può essere ripetuto."""
+    return all(is_idempotent(cmd) for cmd in cmds)
+
+
+def retry_delay(attempt: int, rng: random.Random | None = None) -> float:
+    """Attesa prima del tentativo successivo, backoff esponenziale con jitter pieno."""
+    ceiling = min(RETRY_BASE_DELAY * 2 ** attempt, RETRY_MAX_DELAY)
+    return (rng or random).uniform(0, ceiling)
+
+
+class HeltyCircuitBreaker:
+    """Smette di interrogare un'unità che non risponde.
+
+    Dopo BREAKER_FAILURE_THRESHOLD tentativi falliti di fila il circuito si
+    apre e le richieste falliscono subito. Trascorso il tempo di reset una
+    sola richiesta di prova passa (semiaperto): se riesce il circuito si
+    richiude, altrimenti si riapre con un tempo di reset doppio.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+    ) -> None:
+        self._name = name
+        self._failure_threshold = failure_threshold
+        self._base_reset_timeout = reset_timeout
+        self._reset_timeout = reset_timeout
+        self._opened_at = 0.0
+        self._probing = False
+        self.state = STATE_CLOSED
+        self.failures = 0
+
+    @property
+    def retry_in(self) -> float:
+        """Secondi mancanti alla prossima richiesta di prova."""
+        if self.state != STATE_OPEN:
+            return 0.0
+        return max(self._opened_at + self._reset_timeout - time.monotonic(), 0.0)
+
+    def allow(self) -> bool:
+        """True se una richiesta può partire; in semiaperto ne passa una sola."""
+        if self.state == STATE_OPEN:
+            if self.retry_in > 0:
+                return False
+            self.state = STATE_HALF_OPEN
+            _LOGGER.debug("Circuito di Helty %s semiaperto, richiesta di prova", self._name)
+        if self.state == STATE_HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        if self.state != STATE_CLOSED:
+            _LOGGER.info("Helty %s risponde di nuovo, circuito chiuso", self._name)
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self._probing = False
+        self._reset_timeout = self._base_reset_timeout
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == STATE_HALF_OPEN:
+            self._reset_timeout = min(self._reset_timeout * 2, BREAKER_MAX_RESET_TIMEOUT)
+            self._open()
+        elif self.state == STATE_CLOSED and self.failures >= self._failure_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        self.state = STATE_OPEN
+        self._probing = False
+        self._opened_at = time.monotonic()
+        _LOGGER.debug(
+            "Circuito di Helty %s aperto per %.0fs dopo %s errori",
+            self._name,
+            self._reset_timeout,
+            self.failures,
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_in": round(self.retry_in, 1),
+        }
@@ -0,0 +1,129 @@
+"""Pianificazione adattiva del polling di un'unità Helty."""
+from __future__ import annotations
+
+import math
+
+from .const import (
+    DEFAULT_FAST_DURATION,
+    DEFAULT_FAST_INTERVAL,
+    DEFAULT_MAX_BACKOFF,
+    DEFAULT_SENSORS_INTERVAL,
+    DEFAULT_STATUS_INTERVAL,
+)
+
+# Se l'altro gruppo di campi scade entro questo margine viene letto insieme
+DUE_SLACK = 2.0
+
+
+class HeltyPollScheduler:
+    """Decide quali comandi inviare a ogni polling e quando fare il prossimo.
+
+    Temperature e umidità (VMGI?) seguono una cadenza lenta. Lo stato
+    operativo (VMGH?) passa alla cadenza veloce dopo un comando dell'utente e
+    finché è attivo il preset di boost. Con fast_sensors (boost automatico)
+    anche VMGI? segue la cadenza dello stato, così l'umidità viene riletta a
+    ogni polling veloce. Quando il dispositivo non risponde
+    l'attesa raddoppia a ogni errore fino a max_backoff.
+    Con set_phase i polling a cadenza normale cadono su una griglia comune a
+    più unità, sfasata per ciascuna, così non partono tutti insieme.
+    Tutti i tempi sono in secondi, misurati con un orologio monotono.
+    """
+
+    def __init__(
+        self,
+        sensors_interval: float = DEFAULT_SENSORS_INTERVAL,
+        status_interval: float = DEFAULT_STATUS_INTERVAL,
+        fast_interval: float = DEFAULT_FAST_INTERVAL,
+        fast_duration: float = DEFAULT_FAST_DURATION,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+        fast_sensors: bool = False,
+    ) -> None:
+        self.sensors_interval = sensors_interval
+        self.fast_sensors = fast_sensors
+        self.status_interval = status_interval
+        self.fast_interval = min(fast_interval, status_interval)
+        self.fast_duration = fast_duration
+        self.max_backoff = max(max_backoff, status_interval)
+        self.boost_active = False
+        self.failures = 0
+        self._last_sensors: float | None = None
+        self._last_status: float | None = None
+        self._fast_until = 0.0
+        self._grid_origin: float | None = None
+
+    def set_phase(self, origin: float, phase: float) -> None:
+        """Allinea i polling a origin + phase + k * status_interval."""
+        self._grid_origin = origin + phase
+
+    def status_cadence(self, now: float) -> float:
+        """Intervallo corrente tra due letture dello stato operativo."""
+        if self.boost_active or now < self._fast_until:
+            return self.fast_interval
+        return self.status_interval
+
+    def sensors_cadence(self, now: float) -> float:
+        """Intervallo corrente tra due letture di temperature e umidità."""
+        if self.fast_sensors:
+            return min(self.sensors_interval, self.status_cadence(now))
+        return self.sensors_interval
+
+    def due(self, now: float) -> tuple[bool, bool]:
+        """Restituisce (sensori, stato) da leggere a questo polling.
+
+        Se nessuno dei due è in scadenza (aggiornamento richiesto a mano) si
+        leggono entrambi.
+        """
+        if self.failures:
+            return True, True
+        sensors_wait = self._wait(self._last_sensors, self.sensors_cadence(now), now)
+        status_wait = self._wait(self._last_status, self.status_cadence(now), now)
+        sensors = sensors_wait <= 0
+        status = status_wait <= 0
+        if sensors and not status:
+            status = status_wait <= DUE_SLACK
+        elif status and not sensors:
+            sensors = sensors_wait <= DUE_SLACK
+        if not sensors and not status:
+            return True, True
+        return sensors, status
+
+    def next_delay(self, now: float) -> float:
+        """Secondi da attendere prima del prossimo polling."""
+        if self.failures:
+            return min(self.status_interval * 2 ** (self.failures - 1), self.max_backoff)
+        cadence = self.status_cadence(now)
+        delay = max(
+            min(
+                self._wait(self._last_sensors, self.sensors_cadence(now), now),
+                self._wait(self._last_status, cadence, now),
+            ),
+            1.0,
+        )
+        if self._grid_origin is None or cadence != self.status_interval:
+            return delay
+        # Posticipa fino al prossimo slot assegnato all'unità
+        period = self.status_interval
+        slots = math.ceil((now + delay - self._grid_origin - DUE_SLACK) / period)
+        return max(self._grid_origin + slots * period - now, delay)
+
+    def record_poll(self, now: float, sensors: bool, status: bool) -> None:
+        """Registra un polling riuscito."""
+        self.failures = 0
+        if sensors:
+            self._last_sensors = now
+        if status:
+            self._last_status = now
+
+    def record_failure(self) -> None:
+        """Registra un polling fallito."""
+        self.failures += 1
+
+    def record_command(self, now: float) -> None:
+        """Un comando dell'utente attiva la cadenza veloce per lo stato."""
+        self._fast_until = now + self.fast_duration
+
+    @staticmethod
+    def _wait(last: float | None, interval: float, now: float) -> float:
+        if last is None:
+            return 0.0
+        return last + interval - now
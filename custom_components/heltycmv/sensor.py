@@ -1,36 +1,111 @@
 """Platform for sensor integration."""
 from __future__ import annotations
 
-from homeassistant.components.sensor import SensorEntity, SensorDeviceClass
-from homeassistant.helpers.entity import DeviceInfo
+from datetime import timedelta
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.core import callback
+from homeassistant.helpers.entity import DeviceInfo, EntityCategory
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
-from homeassistant.const import PERCENTAGE, UnitOfTemperature
+from homeassistant.const import PERCENTAGE, UnitOfTemperature, UnitOfTime
 
+from .cmv import HeltyCMV
 from .const import DOMAIN
-from .coordinator import HeltyDataUpdateCoordinator
+from .coordinator import TREND_SUFFIX, HeltyDataUpdateCoordinator
+from .parser import KNOWN_INDEXES, RAW_FIELDS
+
+# Solo i sensori diagnostici sono interrogati: leggono contatori in memoria
+SCAN_INTERVAL = timedelta(seconds=60)
+# I sensori grezzi si aggiungono quando cambiano i campi grezzi
+RAW_FIELDS_CONTEXT = tuple(RAW_FIELDS.values())
+
+# Un sensore per ogni campo con nome dell'istantanea (vedi parser.SENSOR_FIELDS)
+SENSOR_DESCRIPTIONS: tuple[SensorEntityDescription, ...] = (
+    SensorEntityDescription(
+        key="indoor_temp",
+        name="Indoor Temperature",
+        device_class=SensorDeviceClass.TEMPERATURE,
+        native_unit_of_measurement=UnitOfTemperature.CELSIUS,
+    ),
+    SensorEntityDescription(
+        key="outdoor_temp",
+        name="Outdoor Temperature",
+        device_class=SensorDeviceClass.TEMPERATURE,
+        native_unit_of_measurement=UnitOfTemperature.CELSIUS,
+    ),
+    SensorEntityDescription(
+        key="indoor_humidity",
+        name="Indoor Humidity",
+        device_class=SensorDeviceClass.HUMIDITY,
+        native_unit_of_measurement=PERCENTAGE,
+    ),
+)
 
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
     # Ottieni il coordinator
     coordinator: HeltyDataUpdateCoordinator = hass.data[DOMAIN][config_entry.entry_id]
     # Aggiungi le entità passando il coordinator
+    # Solo i campi che l'unità riporta davvero
+    supported = coordinator.device.capabilities.sensor_fields
+    descriptions = [description for description in SENSOR_DESCRIPTIONS if description.key in supported]
+    async_add_entities(
+        [CMVSnapshotSensor(coordinator, description) for description in descriptions]
+    )
+    async_add_entities(
+        [
+            CMVTrendSensor(coordinator, description)
+            for description in descriptions
+            if description.key in coordinator.trends
+        ]
+    )
     async_add_entities(
         [
-            CMVIndoorTemperature(coordinator),
-            CMVOutdoorTemperature(coordinator),
-            CMVIndoorHumidity(coordinator),
-        ],
-        True,
+            CMVCommandLatency(coordinator.device),
+            CMVCommandTimeouts(coordinator.device),
+            CMVCommandRetries(coordinator.device),
+        ]
+    )
+
+    # I campi senza nome diventano sensori grezzi quando il dispositivo li
+    # riporta (valore diverso da zero), anche se compaiono dopo l'avvio
+    added: set[tuple[str, int]] = set()
+
+    @callback
+    def _async_add_raw_sensors() -> None:
+        if coordinator.data is None:
+            return
+        new = []
+        for header, field in RAW_FIELDS.items():
+            for index, value in enumerate(getattr(coordinator.data, field), start=1):
+                if not value or index in KNOWN_INDEXES[header] or (field, index) in added:
+                    continue
+                added.add((field, index))
+                new.append(CMVRawFieldSensor(coordinator, header.decode(), field, index))
+        if new:
+            async_add_entities(new)
+
+    _async_add_raw_sensors()
+    config_entry.async_on_unload(
+        coordinator.async_add_listener(_async_add_raw_sensors, context=RAW_FIELDS_CONTEXT)
     )
 
 
 # La classe base ora eredita da CoordinatorEntity
 class CMVBaseSensor(CoordinatorEntity, SensorEntity):
     _attr_has_entity_name = False
+    # Campo dell'istantanea letto dal sensore: lo stato viene riscritto solo
+    # quando questo campo cambia
+    _field: str
 
     def __init__(self, coordinator: HeltyDataUpdateCoordinator):
         """Inizializza il sensore base."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=(self._field,))
         self._cmv = coordinator.device
 
     @property
@@ -43,61 +118,171 @@ class CMVBaseSensor(CoordinatorEntity, SensorEntity):
             model="Flow",
         )
 
+    @property
+    def available(self) -> bool:
+        """Disponibile finché i valori in cache non superano l'età massima."""
+        return self.coordinator.fields_available(self.coordinator_context)
+
+    @property
+    def extra_state_attributes(self):
+        """Età dei valori mostrati quando il dispositivo non risponde."""
+        return self.coordinator.stale_attributes(self.coordinator_context)
 
-class CMVIndoorTemperature(CMVBaseSensor):
-    """Sensore di Temperatura Interna."""
-    device_class = SensorDeviceClass.TEMPERATURE
-    _attr_native_unit_of_measurement = UnitOfTemperature.CELSIUS
 
-    def __init__(self, coordinator: HeltyDataUpdateCoordinator):
+class CMVSnapshotSensor(CMVBaseSensor):
+    """Sensore di un campo con nome dell'istantanea."""
+
+    def __init__(
+        self, coordinator: HeltyDataUpdateCoordinator, description: SensorEntityDescription
+    ):
+        self._field = description.key
+        self.entity_description = description
         super().__init__(coordinator)
-        self._attr_unique_id = f"{self._cmv.cmv_id}_indoor_temp"
-        self._attr_name = f"{self._cmv.name} Indoor Temperature"
+        self._attr_unique_id = f"{self._cmv.cmv_id}_{description.key}"
+        self._attr_name = f"{self._cmv.name} {description.name}"
 
     @property
     def native_value(self) -> float | None:
         """Restituisce il valore dal coordinator."""
-        # Leggi il valore direttamente dai dati del coordinator
         if self.coordinator.data:
-            return self.coordinator.data.get("indoor_temp")
+            return getattr(self.coordinator.data, self._field)
         return None
 
 
-class CMVOutdoorTemperature(CMVBaseSensor):
-    """Sensore di Temperatura Esterna."""
-    device_class = SensorDeviceClass.TEMPERATURE
-    _attr_native_unit_of_measurement = UnitOfTemperature.CELSIUS
+class CMVRawFieldSensor(CMVBaseSensor):
+    """Valore grezzo di una posizione VMGI/VMGO di cui non si conosce il significato."""
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
 
-    def __init__(self, coordinator: HeltyDataUpdateCoordinator):
+    def __init__(
+        self, coordinator: HeltyDataUpdateCoordinator, header: str, field: str, index: int
+    ):
+        self._field = field
+        self._index = index
         super().__init__(coordinator)
-        self._attr_unique_id = f"{self._cmv.cmv_id}_outdoor_temp"
-        self._attr_name = f"{self._cmv.name} Outdoor Temperature"
+        self._attr_unique_id = f"{self._cmv.cmv_id}_{header.lower()}_{index}"
+        self._attr_name = f"{self._cmv.name} {header} Field {index}"
 
     @property
-    def native_value(self) -> float | None:
+    def native_value(self) -> int | None:
         """Restituisce il valore dal coordinator."""
         if self.coordinator.data:
-            return self.coordinator.data.get("outdoor_temp")
+            values = getattr(self.coordinator.data, self._field)
+            if self._index <= len(values):
+                return values[self._index - 1]
         return None
 
-    # RIMUOVI il metodo async_update()
 
+class CMVTrendSensor(CoordinatorEntity, SensorEntity):
+    """Variazione oraria di un valore sulla finestra recente, con minimo, massimo e media."""
+    _attr_has_entity_name = False
+    _attr_state_class = SensorStateClass.MEASUREMENT
 
-class CMVIndoorHumidity(CMVBaseSensor):
-    """Sensore di Umidità Interna."""
-    device_class = SensorDeviceClass.HUMIDITY
-    _attr_native_unit_of_measurement = PERCENTAGE
+    def __init__(
+        self, coordinator: HeltyDataUpdateCoordinator, description: SensorEntityDescription
+    ):
+        # Aggiornato a ogni nuovo campione, anche se il valore non cambia
+        super().__init__(coordinator, context=(description.key + TREND_SUFFIX,))
+        self._cmv = coordinator.device
+        self._field = description.key
+        self._series = coordinator.trends[description.key]
+        self._attr_unique_id = f"{self._cmv.cmv_id}_{description.key}_trend"
+        self._attr_name = f"{self._cmv.name} {description.name} Trend"
+        self._attr_native_unit_of_measurement = f"{description.native_unit_of_measurement}/h"
 
-    def __init__(self, coordinator: HeltyDataUpdateCoordinator):
-        super().__init__(coordinator)
-        self._attr_unique_id = f"{self._cmv.cmv_id}_indoor_humidity"
-        self._attr_name = f"{self._cmv.name} Indoor Humidity"
+    @property
+    def device_info(self):
+        """Informazioni dispositivo."""
+        return DeviceInfo(identifiers={(DOMAIN, self._cmv.cmv_id)})
+
+    @property
+    def available(self) -> bool:
+        return self.coordinator.fields_available((self._field,))
 
     @property
     def native_value(self) -> float | None:
-        """Restituisce il valore dal coordinator."""
-        if self.coordinator.data:
-            return self.coordinator.data.get("indoor_humidity")
-        return None
+        """Pendenza per ora stimata sui campioni nella finestra."""
+        return self._series.as_dict()["slope_per_hour"]
+
+    @property
+    def extra_state_attributes(self):
+        """Aggregati della finestra: campioni, durata in secondi, minimo, massimo e media."""
+        attributes = self._series.as_dict()
+        del attributes["slope_per_hour"]
+        return attributes
+
+
+class CMVDiagnosticSensor(SensorEntity):
+    """Sensore diagnostico sulle statistiche dei comandi, disattivato di default."""
+    _attr_has_entity_name = False
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _key: str
+    _label: str
+
+    def __init__(self, device: HeltyCMV):
+        self._cmv = device
+        self._attr_unique_id = f"{device.cmv_id}_{self._key}"
+        self._attr_name = f"{device.name} {self._label}"
+
+    @property
+    def device_info(self):
+        """Informazioni dispositivo."""
+        return DeviceInfo(identifiers={(DOMAIN, self._cmv.cmv_id)})
+
+    async def async_update(self) -> None:
+        """Il valore è letto dai contatori del dispositivo, nulla da interrogare."""
+
+
+class CMVCommandLatency(CMVDiagnosticSensor):
+    """Latenza p95 dei comandi."""
+    _key = "command_latency_p95"
+    _label = "Command Latency p95"
+    device_class = SensorDeviceClass.DURATION
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_state_class = SensorStateClass.MEASUREMENT
 
-    # RIMUOVI il metodo async_update()
\ No newline at end of file
+    @property
+    def native_value(self) -> float | None:
+        return self._cmv.stats.rtt.as_dict()["p95_ms"]
+
+    @property
+    def extra_state_attributes(self):
+        """Latenza per tipo di comando."""
+        return {
+            label: stats.rtt.as_dict()["p95_ms"]
+            for label, stats in self._cmv.stats.commands.items()
+        }
+
+
+class CMVCommandTimeouts(CMVDiagnosticSensor):
+    """Numero di richieste scadute."""
+    _key = "command_timeouts"
+    _label = "Command Timeouts"
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+
+    @property
+    def native_value(self) -> int:
+        return self._cmv.stats.timeouts
+
+
+class CMVCommandRetries(CMVDiagnosticSensor):
+    """Numero di riconnessioni durante una richiesta."""
+    _key = "command_retries"
+    _label = "Command Retries"
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+
+    @property
+    def native_value(self) -> int:
+        return self._cmv.stats.retries
+
+    @property
+    def extra_state_attributes(self):
+        stats = self._cmv.stats
+        return {
+            "request_retries": stats.request_retries,
+            "circuit_rejections": stats.circuit_rejections,
+            "partial_reads": stats.partial_reads,
+            "parse_failures": stats.parse_failures,
+            "connect_failures": stats.connect_failures,
+        }
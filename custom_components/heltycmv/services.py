@@ -0,0 +1,78 @@
+"""Domain services for the Helty CMV integration."""
+from __future__ import annotations
+
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+from homeassistant.exceptions import ServiceValidationError
+from homeassistant.helpers import config_validation as cv, device_registry as dr
+
+from .const import ATTR_LEDS_ON, ATTR_MODE, DATA_HUB, DOMAIN, MODE_CMDS, SERVICE_APPLY_FLEET
+from .hub import HeltyHub
+
+
+def _mode(value: Any):
+    """Accept a preset name or a fan speed percentage from MODE_CMDS."""
+    if value in MODE_CMDS:
+        return value
+    try:
+        speed = int(value)
+    except (TypeError, ValueError):
+        speed = None
+    if speed in MODE_CMDS:
+        return speed
+    raise vol.Invalid(f"Unknown mode: {value}")
+
+
+APPLY_FLEET_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Optional("device_id"): vol.All(cv.ensure_list, [cv.string]),
+            vol.Optional(ATTR_MODE): _mode,
+            vol.Optional(ATTR_LEDS_ON): cv.boolean,
+        }
+    ),
+    cv.has_at_least_one_key(ATTR_MODE, ATTR_LEDS_ON),
+)
+
+
+def _entry_ids(hass: HomeAssistant, device_ids: list[str]) -> list[str]:
+    """Config entries of the selected devices."""
+    registry = dr.async_get(hass)
+    entry_ids = []
+    for device_id in device_ids:
+        device = registry.async_get(device_id)
+        units = [
+            entry_id for entry_id in (device.config_entries if device else ())
+            if entry_id in hass.data.get(DOMAIN, {})
+        ]
+        if not units:
+            raise ServiceValidationError(f"Device {device_id} is not a loaded Helty unit")
+        entry_ids.extend(units)
+    return entry_ids
+
+
+async def _async_apply_fleet(call: ServiceCall) -> ServiceResponse:
+    """Write the same mode and/or LED state to many units at once."""
+    hass = call.hass
+    hub: HeltyHub | None = hass.data.get(DATA_HUB)
+    if hub is None or hub.empty:
+        raise ServiceValidationError("No Helty units are loaded")
+    entry_ids = _entry_ids(hass, call.data["device_id"]) if "device_id" in call.data else None
+    results = await hub.async_apply_fleet(
+        entry_ids, call.data.get(ATTR_MODE), call.data.get(ATTR_LEDS_ON)
+    )
+    return {"results": results}
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the domain services."""
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_APPLY_FLEET,
+        _async_apply_fleet,
+        schema=APPLY_FLEET_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
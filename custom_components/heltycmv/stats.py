@@ -0,0 +1,150 @@
+"""Contatori e istogrammi di latenza per ogni unità Helty."""
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import Any
+
+from .protocol import WRITE_PREFIX
+
+# Limiti superiori dei bucket, in secondi
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def command_label(cmd: bytes) -> str:
+    """Etichetta con cui raggruppare i comandi: le scritture VMWH insieme."""
+    if cmd.startswith(WRITE_PREFIX):
+        return WRITE_PREFIX.decode()
+    return cmd.decode('ASCII', 'replace')
+
+
+class LatencyHistogram:
+    """Istogramma a bucket fissi: memoria costante qualunque sia il traffico."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Registra una misura."""
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def mean(self) -> float | None:
+        return self.total / self.count if self.count else None
+
+    def quantile(self, fraction: float) -> float | None:
+        """Limite superiore del bucket che contiene il quantile richiesto."""
+        if not self.count:
+            return None
+        threshold = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= threshold:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else self.max
+        return self.max
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ms": _ms(self.mean),
+            "p50_ms": _ms(self.quantile(0.5)),
+            "p95_ms": _ms(self.quantile(0.95)),
+            "max_ms": _ms(self.max) if self.count else None,
+            "buckets_ms": {
+                _bucket_label(index): bucket_count
+                for index, bucket_count in enumerate(self.counts)
+                if bucket_count
+            },
+        }
+
+
+class CommandStats:
+    """Misure di un tipo di comando."""
+
+    __slots__ = ("rtt", "timeouts", "errors")
+
+    def __init__(self) -> None:
+        self.rtt = LatencyHistogram()
+        self.timeouts = 0
+        self.errors = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {"rtt": self.rtt.as_dict(), "timeouts": self.timeouts, "errors": self.errors}
+
+
+class HeltyDeviceStats:
+    """Strumentazione del percorso dei comandi di un dispositivo."""
+
+    def __init__(self) -> None:
+        self.connect = LatencyHistogram()
+        self.connect_failures = 0
+        self.commands: dict[str, CommandStats] = {}
+        self.timeouts = 0
+        self.partial_reads = 0
+        self.retries = 0
+        self.request_retries = 0
+        self.circuit_rejections = 0
+        self.parse_failures = 0
+
+    def command(self, cmd: bytes) -> CommandStats:
+        """Statistiche del tipo di comando, create al primo uso."""
+        label = command_label(cmd)
+        stats = self.commands.get(label)
+        if stats is None:
+            stats = self.commands[label] = CommandStats()
+        return stats
+
+    def record_rtt(self, cmd: bytes, seconds: float) -> None:
+        self.command(cmd).rtt.observe(seconds)
+
+    def record_timeout(self, cmds) -> None:
+        self.timeouts += 1
+        for cmd in cmds:
+            self.command(cmd).timeouts += 1
+
+    def record_error(self, cmds) -> None:
+        for cmd in cmds:
+            self.command(cmd).errors += 1
+
+    @property
+    def rtt(self) -> LatencyHistogram:
+        """Istogramma complessivo di tutti i comandi."""
+        total = LatencyHistogram()
+        for stats in self.commands.values():
+            total.counts = [a + b for a, b in zip(total.counts, stats.rtt.counts)]
+            total.count += stats.rtt.count
+            total.total += stats.rtt.total
+            total.max = max(total.max, stats.rtt.max)
+        return total
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "connect": self.connect.as_dict(),
+            "connect_failures": self.connect_failures,
+            "timeouts": self.timeouts,
+            "partial_reads": self.partial_reads,
+            "retries": self.retries,
+            "request_retries": self.request_retries,
+            "circuit_rejections": self.circuit_rejections,
+            "parse_failures": self.parse_failures,
+            "commands": {label: stats.as_dict() for label, stats in self.commands.items()},
+        }
+
+
+def _ms(seconds: float | None) -> float | None:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+def _bucket_label(index: int) -> str:
+    if index < len(LATENCY_BUCKETS):
+        return f"<={LATENCY_BUCKETS[index] * 1000:g}"
+    return f">{LATENCY_BUCKETS[-1] * 1000:g}"
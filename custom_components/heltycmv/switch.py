@@ -14,14 +14,16 @@ _LOGGER = logging.getLogger(__name__)
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
     coordinator: HeltyDataUpdateCoordinator = hass.data[DOMAIN][config_entry.entry_id]
-    async_add_entities([HeltyCMVLeds(coordinator)], True)
+    # Lo stato dei LED arriva da VMGO: niente switch se l'unità non lo riporta
+    if coordinator.device.capabilities.leds:
+        async_add_entities([HeltyCMVLeds(coordinator)])
 
 
 class HeltyCMVLeds(CoordinatorEntity, SwitchEntity):
 
     def __init__(self, coordinator: HeltyDataUpdateCoordinator):
         """Inizializza lo switch."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, context=("leds_on",))
         self._cmv = coordinator.device
         self._attr_unique_id = f"{self._cmv.cmv_id}_panel_leds"
         self._attr_name = f"{self._cmv.name} CMV Panel Leds"
@@ -36,25 +38,31 @@ class HeltyCMVLeds(CoordinatorEntity, SwitchEntity):
             model="Flow",
         )
 
-    # La proprietà 'available' è gestita da CoordinatorEntity.
+    @property
+    def available(self) -> bool:
+        """Disponibile finché i valori in cache non superano l'età massima."""
+        return self.coordinator.fields_available(self.coordinator_context)
+
+    @property
+    def extra_state_attributes(self):
+        """Età dei valori mostrati quando il dispositivo non risponde."""
+        return self.coordinator.stale_attributes(self.coordinator_context)
 
     @property
     def is_on(self) -> bool | None:
         """Restituisce lo stato (on/off) dai dati del coordinator."""
         if self.coordinator.data:
-            return self.coordinator.data.get("leds_on")
+            return self.coordinator.data.leds_on
         return None
 
     async def async_turn_on(self, **kwargs: Any) -> None:
         """Accende i LED."""
-        await self._cmv.turn_cmv_leds_on()
-        # Richiede un aggiornamento immediato per riflettere il nuovo stato
-        await self.coordinator.async_request_refresh()
+        if not await self.coordinator.async_set_leds(True):
+            _LOGGER.error("Impossibile accendere i LED")
 
     async def async_turn_off(self, **kwargs: Any) -> None:
         """Spegne i LED."""
-        await self._cmv.turn_cmv_leds_off()
-        # Richiede un aggiornamento immediato per riflettere il nuovo stato
-        await self.coordinator.async_request_refresh()
+        if not await self.coordinator.async_set_leds(False):
+            _LOGGER.error("Impossibile spegnere i LED")
 
     # RIMUOVI il metodo async_update()
\ No newline at end of file
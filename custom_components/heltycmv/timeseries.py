@@ -0,0 +1,175 @@
+"""Serie temporali recenti dei valori letti, con aggregati incrementali."""
+from __future__ import annotations
+
+from array import array
+from collections import deque
+import math
+
+from .const import DEFAULT_TREND_WINDOW
+
+# Campioni per serie se non indicato, e limiti della capacità calcolata
+# dalla finestra: la memoria resta limitata qualunque sia la finestra
+TREND_CAPACITY = 128
+TREND_MIN_CAPACITY = 16
+TREND_MAX_CAPACITY = 1024
+
+
+def trend_capacity(window: float, interval: float) -> int:
+    """Campioni necessari a coprire window con un campione ogni interval secondi.
+
+    Il doppio, così le letture che arrivano un po' in anticipo non vengono
+    scartate; oltre TREND_MAX_CAPACITY la serie viene diradata.
+    """
+    needed = 2 * math.ceil(window / max(interval, 1)) + 1
+    return min(max(needed, TREND_MIN_CAPACITY), TREND_MAX_CAPACITY)
+
+
+class HeltyRollingSeries:
+    """Buffer circolare di campioni (tempo, valore) su una finestra scorrevole.
+
+    I campioni più vecchi di window secondi escono dalla serie. Un campione
+    che arriva meno di window / (capacity - 1) secondi dopo il precedente
+    viene scartato, così la capacità basta sempre a coprire tutta la
+    finestra. Media, minimo, massimo e pendenza (regressione lineare)
+    sono aggiornati a ogni campione in O(1) ammortizzato: somme correnti per
+    media e pendenza, code monotone per minimo e massimo. Le somme vengono
+    ricalcolate rispetto al campione più vecchio ogni capacity uscite, così
+    i tempi restano piccoli e gli errori di arrotondamento non si accumulano.
+    """
+
+    __slots__ = (
+        "capacity", "window", "min_spacing", "_times", "_values", "_next", "_count", "_origin",
+        "_evicted", "_sum_t", "_sum_v", "_sum_tt", "_sum_tv", "_min", "_max",
+    )
+
+    def __init__(self, capacity: int = TREND_CAPACITY, window: float = DEFAULT_TREND_WINDOW) -> None:
+        self.capacity = capacity
+        self.window = window
+        self.min_spacing = window / max(capacity - 1, 1)
+        self._times = array('d', bytes(8 * capacity))
+        self._values = array('d', bytes(8 * capacity))
+        # Numero progressivo del prossimo campione; la posizione è next % capacity
+        self._next = 0
+        self._count = 0
+        self._origin = 0.0
+        self._evicted = 0
+        self._sum_t = self._sum_v = self._sum_tt = self._sum_tv = 0.0
+        # Numeri progressivi dei campioni candidati a minimo e massimo
+        self._min: deque[int] = deque()
+        self._max: deque[int] = deque()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, now: float, value: float) -> None:
+        """Aggiunge un campione; now in secondi, orologio monotono."""
+        self.expire(now)
+        if self._count and now - self._times[(self._next - 1) % self.capacity] < self.min_spacing:
+            return
+        if self._count == self.capacity:
+            self._evict()
+        if not self._count:
+            self._origin = now
+        seq = self._next
+        pos = seq % self.capacity
+        self._times[pos] = now
+        self._values[pos] = value
+        self._next += 1
+        self._count += 1
+        t = now - self._origin
+        self._sum_t += t
+        self._sum_v += value
+        self._sum_tt += t * t
+        self._sum_tv += t * value
+        while self._min and self._value(self._min[-1]) >= value:
+            self._min.pop()
+        self._min.append(seq)
+        while self._max and self._value(self._max[-1]) <= value:
+            self._max.pop()
+        self._max.append(seq)
+
+    def expire(self, now: float) -> None:
+        """Toglie i campioni usciti dalla finestra."""
+        while self._count and now - self._times[self._first % self.capacity] > self.window:
+            self._evict()
+
+    @property
+    def mean(self) -> float | None:
+        return self._sum_v / self._count if self._count else None
+
+    @property
+    def min(self) -> float | None:
+        return self._value(self._min[0]) if self._count else None
+
+    @property
+    def max(self) -> float | None:
+        return self._value(self._max[0]) if self._count else None
+
+    @property
+    def span(self) -> float:
+        """Secondi tra il campione più vecchio e il più recente."""
+        if not self._count:
+            return 0.0
+        return self._times[(self._next - 1) % self.capacity] - self._times[self._first % self.capacity]
+
+    @property
+    def slope(self) -> float | None:
+        """Variazione per secondo stimata con i minimi quadrati, None con meno di due campioni."""
+        n = self._count
+        denominator = n * self._sum_tt - self._sum_t * self._sum_t
+        if n < 2 or denominator <= 0:
+            return None
+        return (n * self._sum_tv - self._sum_t * self._sum_v) / denominator
+
+    @property
+    def _first(self) -> int:
+        return self._next - self._count
+
+    def _value(self, seq: int) -> float:
+        return self._values[seq % self.capacity]
+
+    def _evict(self) -> None:
+        seq = self._first
+        pos = seq % self.capacity
+        t = self._times[pos] - self._origin
+        value = self._values[pos]
+        self._count -= 1
+        self._sum_t -= t
+        self._sum_v -= value
+        self._sum_tt -= t * t
+        self._sum_tv -= t * value
+        if self._min and self._min[0] == seq:
+            self._min.popleft()
+        if self._max and self._max[0] == seq:
+            self._max.popleft()
+        self._evicted += 1
+        if self._evicted >= self.capacity:
+            self._rebase()
+
+    def _rebase(self) -> None:
+        """Ricalcola le somme con origine nel campione più vecchio."""
+        self._evicted = 0
+        self._sum_t = self._sum_v = self._sum_tt = self._sum_tv = 0.0
+        if not self._count:
+            return
+        self._origin = self._times[self._first % self.capacity]
+        for seq in range(self._first, self._next):
+            pos = seq % self.capacity
+            t = self._times[pos] - self._origin
+            value = self._values[pos]
+            self._sum_t += t
+            self._sum_v += value
+            self._sum_tt += t * t
+            self._sum_tv += t * value
+
+    def as_dict(self) -> dict:
+        """Aggregati correnti, pendenza per ora."""
+        slope = self.slope
+        return {
+            "samples": self._count,
+            "span": round(self.span),
+            "min": self.min,
+            "max": self.max,
+            "mean": round(self.mean, 2) if self._count else None,
+            "slope_per_hour": round(slope * 3600, 3) if slope is not None else None,
+        }
@@ -0,0 +1,124 @@
+"""Load test HeltyDataUpdateCoordinator against simulated units.
+
+Starts 1, 10 and 100 simulated units (see helty_simulator.py), registers a
+coordinator for each through the shared HeltyHub exactly as
+async_setup_entry does, and polls them all for a number of rounds. Reports
+poll latency, commands per second, TCP connections opened and failure rate.
+
+Needs Home Assistant installed (the integration's development environment):
+
+    python scripts/benchmark.py --units 1 10 100 --rounds 20
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "scripts"))
+
+from homeassistant.core import HomeAssistant  # noqa: E402
+
+from custom_components.heltycmv.coordinator import HeltyDataUpdateCoordinator  # noqa: E402
+from custom_components.heltycmv.hub import HeltyHub  # noqa: E402
+from helty_simulator import SimulatorConfig, start_fleet  # noqa: E402
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def _timed_refresh(coordinator: HeltyDataUpdateCoordinator) -> tuple[float, bool]:
+    start = time.perf_counter()
+    await coordinator.async_refresh()
+    return time.perf_counter() - start, coordinator.last_update_success
+
+
+async def run_scenario(
+    hass: HomeAssistant, units: int, rounds: int, config: SimulatorConfig
+) -> dict[str, float]:
+    """Poll units simulated devices for rounds rounds and collect metrics."""
+    fleet = await start_fleet(units, config)
+    hub = HeltyHub()
+    coordinators = []
+    for index, unit in enumerate(fleet):
+        entry_id = f"bench_{index}"
+        device = hub.create_device(entry_id, unit.host, unit.port)
+        coordinator = HeltyDataUpdateCoordinator(hass, device=device)
+        hub.register(entry_id, coordinator)
+        coordinators.append(coordinator)
+
+    latencies: list[float] = []
+    failures = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        results = await asyncio.gather(*(_timed_refresh(c) for c in coordinators))
+        latencies.extend(latency for latency, _ in results)
+        failures += sum(1 for _, success in results if not success)
+    elapsed = time.perf_counter() - start
+
+    for index, coordinator in enumerate(coordinators):
+        await coordinator.async_shutdown()
+        await hub.async_remove(f"bench_{index}")
+    for unit in fleet:
+        await unit.stop()
+
+    polls = units * rounds
+    return {
+        "units": units,
+        "polls": polls,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "max_ms": max(latencies) * 1000,
+        "commands_per_s": sum(unit.stats.commands for unit in fleet) / elapsed,
+        "connections": sum(unit.stats.connections for unit in fleet),
+        "rejected": sum(unit.stats.rejected for unit in fleet),
+        "failure_rate": failures / polls,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Run every scenario and print one result line per fleet size."""
+    config = SimulatorConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        fragment_size=args.fragment_size,
+        drop_rate=args.drop_rate,
+        max_clients=args.max_clients,
+        pipelining=not args.no_pipelining,
+    )
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        print(
+            f"{'units':>6} {'polls':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} "
+            f"{'cmd/s':>8} {'conns':>6} {'reject':>6} {'fail':>6}"
+        )
+        for units in args.units:
+            result = await run_scenario(hass, units, args.rounds, config)
+            print(
+                f"{result['units']:>6} {result['polls']:>6} {result['p50_ms']:>8.1f} "
+                f"{result['p95_ms']:>8.1f} {result['max_ms']:>8.1f} "
+                f"{result['commands_per_s']:>8.1f} {result['connections']:>6} "
+                f"{result['rejected']:>6} {result['failure_rate']:>6.1%}"
+            )
+        await hass.async_stop(force=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--units", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--fragment-size", type=int, default=0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--max-clients", type=int, default=2)
+    parser.add_argument("--no-pipelining", action="store_true")
+    asyncio.run(main(parser.parse_args()))
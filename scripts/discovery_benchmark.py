@@ -0,0 +1,52 @@
+"""Time a LAN discovery sweep against simulated units.
+
+Starts simulated units (see helty_simulator.py) on consecutive loopback
+addresses, all on the same port, and scans the surrounding /24 exactly as
+the config flow's discovery step does. Reports the units found and how long
+the sweep took.
+
+Needs Home Assistant installed (the integration's development environment):
+
+    python scripts/discovery_benchmark.py --units 14 --subnet 127.0.0.0/24
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "scripts"))
+
+from custom_components.heltycmv.discovery import async_scan  # noqa: E402
+from helty_simulator import SimulatorConfig, start_fleet  # noqa: E402
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Start the fleet, sweep the subnet once and print the result."""
+    config = SimulatorConfig(latency=args.latency)
+    fleet = await start_fleet(
+        args.units, config, host=args.first_host, base_port=args.port, spread_hosts=True
+    )
+    start = time.perf_counter()
+    found = await async_scan(args.subnet, args.port, concurrency=args.concurrency)
+    elapsed = time.perf_counter() - start
+    for unit in found:
+        print(f"{unit.host}:{unit.port}  {unit.name}")
+    print(f"{len(found)}/{args.units} units found in {elapsed:.2f}s")
+    for unit in fleet:
+        await unit.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--units", type=int, default=14)
+    parser.add_argument("--subnet", default="127.0.0.0/24")
+    parser.add_argument("--first-host", default="127.0.0.10")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--concurrency", type=int, default=64)
+    asyncio.run(main(parser.parse_args()))
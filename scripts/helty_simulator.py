@@ -0,0 +1,283 @@
+"""Local stand-in for the Wi-Fi module of a Helty CMV unit.
+
+Speaks the same raw VMxx protocol as the real units (VMNM?, VMGI?, VMGH? and
+the VMWH writes from const.py) so HeltyCMV can be exercised and benchmarked
+without hardware. Latency, jitter, fragmented or truncated replies, dropped
+connections and the small client limit of the real module are all
+configurable.
+
+Run standalone with, for example:
+
+    python scripts/helty_simulator.py --units 3 --base-port 5001 --latency 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from dataclasses import dataclass, field
+import ipaddress
+import logging
+import random
+import re
+
+_LOGGER = logging.getLogger(__name__)
+
+COMMAND_RE = re.compile(rb"VM[A-Z]{2}\?|VMWH\d{7}")
+TERMINATOR = b"\r\n"
+SENSORS_FIELDS = 15
+CONFIG_FIELDS = 15
+
+
+@dataclass
+class SimulatorConfig:
+    """Behaviour of a simulated unit."""
+
+    latency: float = 0.02
+    jitter: float = 0.0
+    fragment_size: int = 0
+    fragment_delay: float = 0.005
+    drop_rate: float = 0.0
+    truncate_size: int = 0
+    max_clients: int = 2
+    idle_timeout: float = 0.0
+    pipelining: bool = True
+    push_frames: bool = False
+
+
+@dataclass
+class SimulatorStats:
+    """Counters collected by a simulated unit."""
+
+    connections: int = 0
+    rejected: int = 0
+    dropped: int = 0
+    truncated: int = 0
+    commands: int = 0
+    max_active: int = 0
+    active: int = 0
+
+
+@dataclass
+class UnitState:
+    """Register values reported by a simulated unit."""
+
+    name: str
+    indoor_temp: float = 21.5
+    outdoor_temp: float = 12.3
+    indoor_humidity: float = 45.6
+    op_state: int = 1
+    leds: int = 10
+    filter_resets: int = 0
+    extra_sensors: list[int] = field(default_factory=list)
+
+
+class HeltySimulator:
+    """One simulated unit listening on its own TCP port."""
+
+    def __init__(
+        self,
+        name: str,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        config: SimulatorConfig | None = None,
+        seed: int | None = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.config = config or SimulatorConfig()
+        self.state = UnitState(name)
+        self.stats = SimulatorStats()
+        self._random = random.Random(seed)
+        self._server: asyncio.Server | None = None
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    async def start(self) -> None:
+        """Start listening; an ephemeral port is picked when port is 0."""
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        """Stop listening and drop every client."""
+        if self._server is not None:
+            self._server.close()
+            # Since Python 3.12 wait_closed() also waits for open connections
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def press_panel(self, op_state: int) -> None:
+        """Change the operating state as the unit's own panel would.
+
+        With push_frames every connected client also gets the new VMGO
+        frame without asking for it.
+        """
+        self.state.op_state = op_state
+        if self.config.push_frames:
+            frame = self.reply(b"VMGH?") + TERMINATOR
+            for writer in self._writers:
+                writer.write(frame)
+
+    def reply(self, cmd: bytes) -> bytes:
+        """Return the reply the unit gives to a single command."""
+        state = self.state
+        if cmd == b"VMNM?":
+            return b"VMNM" + state.name.encode("ascii")
+        if cmd == b"VMGI?":
+            values = [
+                round(state.indoor_temp * 10),
+                round(state.outdoor_temp * 10),
+                round(state.indoor_humidity * 10),
+                *state.extra_sensors,
+            ]
+            values += [0] * (SENSORS_FIELDS - len(values))
+            return b"VMGI," + b",".join(b"%05d" % value for value in values)
+        if cmd == b"VMGH?":
+            values = [state.op_state, state.leds]
+            values += [0] * (CONFIG_FIELDS - len(values))
+            return b"VMGO," + b",".join(b"%05d" % value for value in values)
+        if cmd.startswith(b"VMWH"):
+            register, value = int(cmd[4:6]), int(cmd[6:])
+            if register == 0:
+                state.op_state = value
+            elif register == 1:
+                state.leds = value
+            elif register == 4:
+                state.filter_resets += 1
+            return b"OK"
+        return b"ERR"
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        stats = self.stats
+        if stats.active >= self.config.max_clients:
+            # The real module accepts the TCP connection and closes it at once
+            stats.rejected += 1
+            writer.close()
+            return
+        stats.connections += 1
+        stats.active += 1
+        self._writers.add(writer)
+        stats.max_active = max(stats.max_active, stats.active)
+        buffer = b""
+        try:
+            while True:
+                try:
+                    async with asyncio.timeout(self.config.idle_timeout or None):
+                        data = await reader.read(1024)
+                except TimeoutError:
+                    break
+                if not data:
+                    break
+                buffer += data
+                cmds = COMMAND_RE.findall(buffer)
+                if not cmds:
+                    continue
+                buffer = b""
+                if not self.config.pipelining:
+                    # Older firmware only answers the first command of a burst
+                    cmds = cmds[:1]
+                if self._random.random() < self.config.drop_rate:
+                    stats.dropped += 1
+                    break
+                await asyncio.sleep(
+                    max(self.config.latency + self._random.uniform(-1, 1) * self.config.jitter, 0)
+                )
+                stats.commands += len(cmds)
+                payload = b"".join(self.reply(cmd) + TERMINATOR for cmd in cmds)
+                if self.config.truncate_size:
+                    # Hang up mid-reply, as a module that resets does
+                    stats.truncated += 1
+                    await self._send(writer, payload[:self.config.truncate_size])
+                    break
+                await self._send(writer, payload)
+        except ConnectionError:
+            pass
+        finally:
+            stats.active -= 1
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _send(self, writer: asyncio.StreamWriter, payload: bytes) -> None:
+        size = self.config.fragment_size
+        if not size:
+            writer.write(payload)
+            await writer.drain()
+            return
+        for start in range(0, len(payload), size):
+            writer.write(payload[start:start + size])
+            await writer.drain()
+            await asyncio.sleep(self.config.fragment_delay)
+
+
+async def start_fleet(
+    count: int,
+    config: SimulatorConfig | None = None,
+    host: str = "127.0.0.1",
+    base_port: int = 0,
+    spread_hosts: bool = False,
+) -> list[HeltySimulator]:
+    """Start count simulated units, on consecutive ports when base_port is set.
+
+    With spread_hosts every unit listens on base_port at consecutive addresses
+    starting from host, like a real subnet (127.0.0.0/8 is all loopback).
+    """
+    units = []
+    for index in range(count):
+        if spread_hosts:
+            unit_host, unit_port = str(ipaddress.ip_address(host) + index), base_port
+        else:
+            unit_host, unit_port = host, base_port + index if base_port else 0
+        unit = HeltySimulator(
+            f"Helty Sim {index + 1}",
+            host=unit_host,
+            port=unit_port,
+            config=config,
+            seed=index,
+        )
+        await unit.start()
+        units.append(unit)
+    return units
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    config = SimulatorConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        fragment_size=args.fragment_size,
+        drop_rate=args.drop_rate,
+        truncate_size=args.truncate_size,
+        max_clients=args.max_clients,
+        idle_timeout=args.idle_timeout,
+        pipelining=not args.no_pipelining,
+    )
+    units = await start_fleet(args.units, config, args.host, args.base_port, args.spread_hosts)
+    for unit in units:
+        _LOGGER.info("%s listening on %s:%s", unit.state.name, unit.host, unit.port)
+    await asyncio.Event().wait()
+
+
+def main() -> None:
+    """Run simulated units until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--units", type=int, default=1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=5001)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--fragment-size", type=int, default=0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--truncate-size", type=int, default=0)
+    parser.add_argument("--max-clients", type=int, default=2)
+    parser.add_argument("--idle-timeout", type=float, default=0.0)
+    parser.add_argument("--no-pipelining", action="store_true")
+    parser.add_argument("--spread-hosts", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""HeltyCMV against the simulated unit from scripts/helty_simulator.py."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+
+from helty_simulator import CONFIG_FIELDS, SENSORS_FIELDS, HeltySimulator, SimulatorConfig
+import pytest
+
+from custom_components.heltycmv.cmv import HeltyCMV
+from custom_components.heltycmv.const import FAN_HIGHEST, FAN_LOW, FAN_MEDIUM
+from custom_components.heltycmv.resilience import (
+    STATE_CLOSED,
+    STATE_OPEN,
+    CircuitOpenError,
+    HeltyCircuitBreaker,
+)
+
+
+async def _start(config: SimulatorConfig | None = None) -> tuple[HeltySimulator, HeltyCMV]:
+    unit = HeltySimulator("Test Unit", config=config or SimulatorConfig(latency=0.005))
+    await unit.start()
+    return unit, HeltyCMV(unit.host, unit.port)
+
+
+async def _stop(unit: HeltySimulator, device: HeltyCMV) -> None:
+    await device.async_close()
+    await unit.stop()
+
+
+async def _wait_for(condition: Callable[[], bool], timeout: float = 1.0) -> None:
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+def test_snapshot_reads_every_field() -> None:
+    """One pipelined round trip returns both replies."""
+
+    async def run() -> None:
+        unit, device = await _start()
+        try:
+            snapshot = await device.async_get_snapshot()
+            assert (snapshot.indoor_temp, snapshot.outdoor_temp) == (21.5, 12.3)
+            assert snapshot.indoor_humidity == 45.6
+            assert (snapshot.fan_mode, snapshot.leds_on) == (FAN_LOW, True)
+            assert len(snapshot.sensors_raw) == SENSORS_FIELDS
+            assert len(snapshot.config_raw) == CONFIG_FIELDS
+            assert device.diagnostics()["pipelining"] is True
+            assert unit.stats.connections == 1
+        finally:
+            await _stop(unit, device)
+
+    asyncio.run(run())
+
+
+def test_firmware_without_pipelining_falls_back_to_request_reply() -> None:
+    async def run() -> None:
+        unit, device = await _start(SimulatorConfig(latency=0.005, pipelining=False))
+        try:
+            snapshot = await device.async_get_snapshot()
+            assert (snapshot.indoor_humidity, snapshot.fan_mode) == (45.6, FAN_LOW)
+            assert device.diagnostics()["pipelining"] is False
+        finally:
+            await _stop(unit, device)
+
+    asyncio.run(run())
+
+
+def test_pause_inside_a_frame_does_not_split_it() -> None:
+    """A reply paused mid-number is read whole and nothing leaks to the next one."""
+
+    async def run() -> None:
+        unit, device = await _start(
+            SimulatorConfig(latency=0.005, fragment_size=48, fragment_delay=0.4)
+        )
+        try:
+            for _ in range(2):
+                snapshot = await device.async_get_snapshot(config=False)
+                assert snapshot.indoor_humidity == 45.6
+                assert len(snapshot.sensors_raw) == SENSORS_FIELDS
+        finally:
+            await _stop(unit, device)
+
+    asyncio.run(run())
+
+
+def test_truncated_frame_never_publishes_a_cut_number() -> None:
+    """A reply cut mid-number by a hang-up is dropped, not read as a value."""
+
+    async def run() -> None:
+        # VMGI,00215,00123,00 and then the unit closes the socket
+        unit, device = await _start(SimulatorConfig(latency=0.005, truncate_size=19))
+        try:
+            with pytest.raises(ConnectionError):
+                await device.async_get_snapshot(config=False)
+            assert unit.stats.truncated >= 1
+        finally:
+            await _stop(unit, device)
+
+    asyncio.run(run())
+
+
+def test_truncated_frame_keeps_only_complete_fields() -> None:
+    async def run() -> None:
+        # Seven whole fields, then half of the eighth
+        unit, device = await _start(SimulatorConfig(latency=0.005, truncate_size=48))
+        try:
+            snapshot = await device.async_get_snapshot(config=False)
+            assert snapshot.indoor_humidity == 45.6
+            assert snapshot.sensors_raw == (215, 123, 456, 0, 0, 0, 0)
+        finally:
+            await _stop(unit, device)
+
+    asyncio.run(run())
+
+
+def test_queued_writes_to_one_register_are_replaced() -> None:
+    """Only the last of several queued mode writes reaches the unit."""
+
+    async def run() -> None:
+        unit, device = await _start(SimulatorConfig(latency=0.05))
+        try:
+            busy = asyncio.create_task(device.async_get_snapshot())
+            await asyncio.sleep(0.01)
+            writes = [device.async_write(mode=mode) for mode in (FAN_LOW, FAN_MEDIUM, FAN_HIGHEST)]
+            _, *results = await asyncio.gather(busy, *writes)
+            assert results == [True, True, True]
+            assert unit.state.op_state == 4
+            # VMGI? and VMGH? for the snapshot, then a single write
+            assert unit.stats.commands == 3
+        finally:
+            await _stop(unit, device)
+
+    asyncio.run(run())
+
+
+def test_circuit_breaker_opens_and_closes_again() -> None:
+    async def run() -> None:
+        unit, device = await _start()
+        device._breaker = HeltyCircuitBreaker(unit.host, failure_threshold=1, reset_timeout=0.2)
+        try:
+            await device.async_get_snapshot()
+            await unit.stop()
+            with pytest.raises(ConnectionError):
+                await device.async_get_snapshot()
+            assert device._breaker.state == STATE_OPEN
+            assert not device.online
+            # Fails at once, without trying to connect
+            with pytest.raises(CircuitOpenError):
+                await device.async_get_snapshot()
+
+            await unit.start()
+            # Past the breaker reset and the connection backoff
+            await asyncio.sleep(1.1)
+            snapshot = await device.async_get_snapshot()
+            assert snapshot.indoor_humidity == 45.6
+            assert device._breaker.state == STATE_CLOSED
+            assert device.online
+        finally:
+            await _stop(unit, device)
+
+    asyncio.run(run())
+
+
+def test_pushed_frames_reach_the_listener_between_requests() -> None:
+    """A VMGO pushed by the panel is delivered at once, not as the next reply."""
+
+    async def run() -> None:
+        unit, device = await _start(SimulatorConfig(latency=0.005, push_frames=True))
+        pushed: list[dict] = []
+        device.set_push_listener(pushed.append)
+        try:
+            snapshot = await device.async_get_snapshot()
+            for op_state, fan_mode, preset in ((2, 50, None), (4, 100, None), (6, None, "Night")):
+                unit.press_panel(op_state)
+                await _wait_for(lambda: len(pushed) == 1)
+                assert (pushed.pop()["fan_mode"], unit.state.op_state) == (fan_mode, op_state)
+                snapshot = await device.async_get_snapshot(snapshot, sensors=False)
+                assert (snapshot.fan_mode, snapshot.preset) == (fan_mode, preset)
+        finally:
+            await _stop(unit, device)
+
+    asyncio.run(run())
+
+
+def test_frame_pushed_before_a_write_is_not_replayed_after_it() -> None:
+    """The old state pushed before a write must not roll the write back."""
+
+    async def run() -> None:
+        unit, device = await _start(SimulatorConfig(latency=0.005, push_frames=True))
+        events: list = []
+        device.set_push_listener(lambda values: events.append(values["fan_mode"]))
+        try:
+            await device.async_get_snapshot()
+            unit.press_panel(3)
+            await _wait_for(lambda: events == [75])
+            assert await device.async_write(mode=50)
+            events.append("written")
+            snapshot = await device.async_get_snapshot(sensors=False)
+            assert events == [75, "written"]
+            assert snapshot.fan_mode == 50
+        finally:
+            await _stop(unit, device)
+
+    asyncio.run(run())